@@ -1,5 +1,6 @@
 import os, glob, re
 from . import listdisplay
+from .utils import Trie, list_directory
 class BadAnswer(Exception):
     pass
 class BadRange(BadAnswer):
@@ -16,6 +17,19 @@ class AmbiguousAutoCompleteMatch(BadAnswer):
 class Answer(object):
     def get_candidates(self):
         return None
+    def get_index(self):
+        # prefix index over the candidates; subclasses whose candidates
+        # don't change between questions should cache it.
+        cands = self.get_candidates()
+        if cands is None:
+            return None
+        return Trie(cands)
+    def get_completions(self):
+        # sorted candidate names for the readline completer
+        cands = self.get_candidates()
+        if cands is None:
+            return None
+        return sorted(map(str, cands))
     def validate(self, result):
         return result
     def do_convert(self, chosen, entered):
@@ -72,8 +86,25 @@ class FloatAnswer(Boundable, SimpleConversion):
 class Choice(Answer):
     def __init__(self, choices):
         self.choices = choices
+    def _set_choices(self, choices):
+        self._choices = choices
+        self._index = None
+        self._completions = None
+    choices = property(lambda self: self._choices, _set_choices)
     def get_candidates(self):
         return self.choices
+    def get_index(self):
+        # rebuilt if the choices are replaced or grow/shrink in place
+        if self._index is None or self._indexed_len != len(self._choices):
+            self._index = Trie(self._choices)
+            self._indexed_len = len(self._choices)
+        return self._index
+    def get_completions(self):
+        if self._completions is None or \
+           self._completed_len != len(self._choices):
+            self._completions = Answer.get_completions(self)
+            self._completed_len = len(self._choices)
+        return self._completions
     def validate(self, result):
         if result not in self.choices:
             raise BadChoice, "answer must be one of %s" % \
@@ -84,9 +115,26 @@ class Pathname(Answer):
     def __init__(self, directory=None, glob="*"):
         self.directory = directory or os.getcwd()
         self.glob = glob
+        self._index = self._indexed = None
+        self._completions = self._completed = None
+    def _matches(self, listing):
+        return listing.glob(self.glob)
     def get_candidates(self):
-        return [os.path.basename(f) for f in \
-                glob.glob(os.path.join(self.directory,self.glob))]
+        return list(self._matches(list_directory(self.directory)))
+    def get_index(self):
+        # reuse the index for as long as the directory listing is current
+        listing = list_directory(self.directory)
+        matches = self._matches(listing)
+        if self._indexed is not matches:
+            self._index = Trie(matches)
+            self._indexed = matches
+        return self._index
+    def get_completions(self):
+        matches = self._matches(list_directory(self.directory))
+        if self._completed is not matches:
+            self._completions = sorted(matches)
+            self._completed = matches
+        return self._completions
     def validate(self, result):
         if not os.path.exists(result):
             raise BadAnswer, "File or directory does not exist."
@@ -98,11 +146,19 @@ class File(Pathname):
     def __init__(self, directory=None, glob="*", mode="r"):
         Pathname.__init__(self, directory, glob)
         self.mode = mode
+    def _matches(self, listing):
+        return listing.files(self.glob)
     def get_candidates(self):
         if self.mode in ("r", "rb", "r+", "rb+"):
-            return [os.path.basename(f) for f in \
-                    glob.glob(os.path.join(self.directory, self.glob)) if \
-                    os.path.isfile(f)]
+            return Pathname.get_candidates(self)
+        return None
+    def get_index(self):
+        if self.mode in ("r", "rb", "r+", "rb+"):
+            return Pathname.get_index(self)
+        return None
+    def get_completions(self):
+        if self.mode in ("r", "rb", "r+", "rb+"):
+            return Pathname.get_completions(self)
         return None
     def validate(self, result):
         return result # any failure will already be apparent in convert().
@@ -128,6 +184,10 @@ class MenuAnswer(Answer):
         self.menu = menu
     def get_candidates(self):
         return self.menu.options()
+    def get_index(self):
+        return self.menu.candidate_index()
+    def get_completions(self):
+        return self.menu.completions()
     def do_convert(self, ans, entered):
         if self.menu.shell or ans.name == 'help':
             return (ans, ' '.join(entered.split(' ')[1:]))
@@ -146,6 +206,10 @@ class AgreeAnswer(Answer):
 class MenuHelpAnswer(MenuAnswer):
     def get_candidates(self):
         return self.menu.helptopics()
+    def get_index(self):
+        return Answer.get_index(self)
+    def get_completions(self):
+        return Answer.get_completions(self)
     def do_convert(self, ans, entered):
         return ans
 
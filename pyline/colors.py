@@ -1,36 +1,67 @@
+import re, itertools
+
+_clear_code = '\033[0m'
+
 class EffectBase(object):
+    """Root of effect chains: ``e.green.on_blue.bold``.
+
+    Looking up an effect name resolves the chain one step and stores the
+    result on the instance, so later lookups of the same chain are
+    ordinary attribute accesses.  Effect sequences are interned, so each
+    distinct chain exists (and is resolved) only once.
+"""
     alleffects = {}
-    def __getattribute__(self, attrname):
-        if attrname == 'alleffects':
-            return EffectBase.alleffects
-        if attrname == 'followed_by':
-            return object.__getattribute__(self, attrname)
-        alleffects = EffectBase.alleffects
-        if attrname in alleffects:
-            return self.followed_by(alleffects[attrname])
-        raise AttributeError
+    affixes = None
+    generation = 0 # effects never change; see ColorScheme.generation
+    def __getattr__(self, attrname):
+        try:
+            nexteffect = EffectBase.alleffects[attrname]
+        except KeyError:
+            raise AttributeError(attrname)
+        effect = self.followed_by(nexteffect)
+        self.__dict__[attrname] = effect
+        return effect
     def followed_by(self, nexteffect):
         return nexteffect
 
 class EffectSequence(EffectBase):
+    interned = {}
     def __init__(self, *seq):
         EffectBase.__init__(self)
         self.effects = seq
-    def __getattribute__(self, attrname):
-        if attrname in ("effects", "followed_by", "__getitem__", "__str__",
-                        "effectize"):
-            return object.__getattribute__(self, attrname)
-        return EffectBase.__getattribute__(self, attrname)
+        self.code = merge_sgr(e.code for e in seq)
+        self.affixes = _sequence_affixes(seq)
+    @classmethod
+    def of(cls, seq):
+        """The shared sequence for the tuple of effects ``seq``."""
+        try:
+            return cls.interned[seq]
+        except KeyError:
+            return cls.interned.setdefault(seq, cls(*seq))
     def followed_by(self, nexteffect):
-        return EffectSequence(*(self.effects+(nexteffect,)))
+        return EffectSequence.of(self.effects+(nexteffect,))
     def __getitem__(self, text):
+        if self.affixes:
+            return self.affixes[0] + text + self.affixes[1]
         for e in reversed(self.effects):
             text = e.effectize(text)
         return clear.effectize(text)
     effectize = __getitem__
     __format__ = __getitem__
     def __str__(self):
-        return ''.join(e.code for e in self.effects)
+        return self.code
+
+def _sequence_affixes(seq):
+    prefix = []
+    post = []
+    for e in seq:
+        if isinstance(e, Replacer):
+            return None
+        elif isinstance(e, PostEffect):
+            post.append(e.code)
+        else:
+            prefix.append(e.code)
+    return (merge_sgr(prefix), ''.join(reversed(post)) + _clear_code)
 
 class Effect(EffectBase):
     def __init__(self, code, *names):
@@ -38,13 +69,9 @@ class Effect(EffectBase):
         for name in names:
             self.alleffects[name] = self
         self.code = code
-    def __getattribute__(self, attrname):
-        if attrname in ("code", "followed_by", "__getitem__", '__str__',
-                        'effectize'):
-            return object.__getattribute__(self, attrname)
-        return EffectBase.__getattribute__(self, attrname)
+        self.affixes = (code, _clear_code)
     def followed_by(self, nexteffect):
-        return EffectSequence(self, nexteffect)
+        return EffectSequence.of((self, nexteffect))
     def __getitem__(self, text):
         return clear.effectize(self.code + text)
     __format__ = __getitem__
@@ -54,7 +81,8 @@ class Effect(EffectBase):
         return self.code
 
 class NullEffect(EffectBase):
-    def __getattribute__(self, _):
+    affixes = ('', '')
+    def __getattr__(self, _):
         return self
     def __format__(self, text):
         return text
@@ -64,10 +92,7 @@ class Replacer(Effect):
         self.orig = orig
         self.repl = repl
         Effect.__init__(self, '', *names)
-    def __getattribute__(self, k):
-        if k in ("orig", "repl"):
-            return object.__getattribute__(self, k)
-        return Effect.__getattribute__(self, k)
+        self.affixes = None
     def __getitem__(self, text):
         return text.replace(self.orig, self.repl)
     effectize = __getitem__
@@ -76,35 +101,173 @@ class Replacer(Effect):
         return ''
 
 class PostEffect(Effect):
+    def __init__(self, code, *names):
+        Effect.__init__(self, code, *names)
+        self.affixes = ('', code)
     def __getitem__(self, text):
         return text + self.code
     __format__ = __getitem__
     effectize = __getitem__
 
+_generations = itertools.count(1)
+
+class ColorMap(dict):
+    """A :py:class:`ColorScheme`'s ``colormap``: a dict whose ``generation``
+    changes (to a number no other colormap has had) whenever it does.
+"""
+    def __init__(self, *args, **ks):
+        dict.__init__(self, *args, **ks)
+        self.generation = next(_generations)
+    def _changing(method):
+        def changing(self, *args, **ks):
+            try:
+                return method(self, *args, **ks)
+            finally:
+                self.generation = next(_generations)
+        changing.__name__ = method.__name__
+        return changing
+    __setitem__ = _changing(dict.__setitem__)
+    __delitem__ = _changing(dict.__delitem__)
+    clear = _changing(dict.clear)
+    pop = _changing(dict.pop)
+    popitem = _changing(dict.popitem)
+    setdefault = _changing(dict.setdefault)
+    update = _changing(dict.update)
+    del _changing
+
 class ColorScheme(object):
     def __init__(self, **ks):
-        self.colormap = {}
+        self.colormap = ColorMap()
+        self.resolved = {} # name -> (colormap entry, effect)
         for (k,v) in ks.iteritems():
             if isinstance(v, (str,unicode)):
                 self.colormap[k] = v.split()
             else:
                 self.colormap[k] = v
-    def __getattribute__(self, attrname):
-        if attrname == 'colormap':
-            return object.__getattribute__(self, attrname)
-        cm = self.colormap
-        effects = cm.get(attrname, None)
-        if not effects: return getattr(e, attrname)
-        effect = e
-        while effects:
-            effect = getattr(effect, effects[0])
-            effects = effects[1:]
+    def __setattr__(self, name, value):
+        if name == 'colormap' and not isinstance(value, ColorMap):
+            value = ColorMap(value)
+        object.__setattr__(self, name, value)
+    @property
+    def generation(self):
+        """Changes whenever the colormap does, so that what was looked up
+        in the scheme can be cached under ``(scheme, generation)``."""
+        return self.colormap.generation
+    def __getattr__(self, attrname):
+        if attrname in ('colormap', 'resolved'):
+            raise AttributeError(attrname)
+        effects = self.colormap.get(attrname, None)
+        cached = self.resolved.get(attrname)
+        if cached and cached[0] is effects:
+            return cached[1]
+        if not effects:
+            effect = getattr(e, attrname)
+        else:
+            effect = e
+            for name in effects:
+                effect = getattr(effect, name)
+        self.resolved[attrname] = (effects, effect)
         return effect
-    
+
+_sgr_pat = re.compile('\033\\[([0-9;]*)m')
+
+def merge_sgr(codes):
+    """Join escape codes, combining runs of SGR (``\\033[...m``) codes into
+    one: ``\\033[32m\\033[1m`` becomes ``\\033[32;1m``."""
+    out = []
+    params = []
+    for code in codes:
+        m = _sgr_pat.match(code)
+        if m and m.end() == len(code) and m.group(1):
+            params.append(m.group(1))
+            continue
+        if params:
+            out.append('\033[%sm' % ';'.join(params))
+            params = []
+        out.append(code)
+    if params:
+        out.append('\033[%sm' % ';'.join(params))
+    return ''.join(out)
+
+def _sgr_category(param):
+    # SGR parameters that replace one another rather than accumulating
+    if param[:2] == '38':
+        return 'fg'
+    if param[:2] == '48':
+        return 'bg'
+    n = int(param)
+    if 30 <= n <= 39 or 90 <= n <= 97:
+        return 'fg'
+    if 40 <= n <= 49 or 100 <= n <= 107:
+        return 'bg'
+    return param
+
+def _sgr_apply(state, params):
+    params = params.split(';')
+    i = 0
+    while i < len(params):
+        p = params[i] or '0'
+        i += 1
+        if p in ('38', '48'): # extended color: 38;5;n or 38;2;r;g;b
+            n = 2 if params[i:i+1] == ['5'] else 4
+            p = ';'.join([p] + params[i:i+n])
+            i += n
+        if p == '0':
+            state = ()
+            continue
+        if p in state:
+            continue
+        cat = _sgr_category(p)
+        state = tuple(q for q in state if _sgr_category(q) != cat) + (p,)
+    return state
+
+def _sgr_transition(old, new):
+    if set(old) == set(new):
+        return ''
+    if not new:
+        return _clear_code
+    cats = set(_sgr_category(p) for p in new)
+    if all(p in new or _sgr_category(p) in cats for p in old):
+        return '\033[%sm' % ';'.join(p for p in new if p not in old)
+    return '\033[0;%sm' % ';'.join(new)
+
+def optimize_sgr(text):
+    """Rewrite the SGR escape codes in ``text`` so that each change of style
+    is a single escape sequence, emitted only just before the text it
+    applies to.  Stacked codes are merged, and codes that don't change
+    the style in effect (like a reset followed by the same style, or a
+    reset when nothing is set) are dropped.  Text is assumed to start
+    with no attributes set.
+"""
+    if '\033[' not in text:
+        return text
+    out = []
+    emitted = pending = ()
+    pos = 0
+    for m in _sgr_pat.finditer(text):
+        if m.start() > pos:
+            out.append(_sgr_transition(emitted, pending))
+            emitted = pending
+            out.append(text[pos:m.start()])
+        pending = _sgr_apply(pending, m.group(1))
+        pos = m.end()
+    out.append(_sgr_transition(emitted, pending))
+    out.append(text[pos:])
+    return ''.join(out)
+
+def affixes(effect):
+    """Return ``(prefix, suffix)`` such that formatting ``effect`` with any
+    text gives ``prefix + text + suffix``, or ``None`` if it doesn't
+    simply wrap the text (e.g. it contains a :py:class:`Replacer`)."""
+    if isinstance(effect, EffectBase):
+        return effect.affixes
+    return None
+
 clear = PostEffect('\033[0m', 'clear', 'reset') 
 Effect('\033[1m', 'bold')
 Effect('\033[K', 'erase_line', 'el')
 Effect('\033[P', 'erase_char', 'ec')
+Effect('\033[A', 'cursor_up', 'cu')
 Effect('\033[2m', 'dark')
 Effect('\033[4m', 'underscore', 'underline', 'under', 'ul')
 Effect('\033[5m', 'blink')
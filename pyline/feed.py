@@ -0,0 +1,110 @@
+"""Answer questions from a prepared set of answers instead of the user.
+
+An :py:class:`AnswerFeed` given to a :py:class:`PyLine` (see its ``feed``
+argument) answers each question it has an answer for without showing the
+prompt, paging or echoing.  The answer is converted and validated as if
+it had been typed.  This lets a wizard written with PyLine be run
+unattended, as fast as its own code allows.
+"""
+from .answers import BadAnswer
+
+class FeedError(Exception):
+    """The feed had no answer for a question (when ``strict``), or its
+    answer was rejected."""
+    pass
+
+_missing = object()
+unanswered = object() # returned by AnswerFeed.ask for questions it can't answer
+
+class AnswerFeed(object):
+    """Answers to questions, looked up by:
+
+    1. position: the number of the question in the session, from 0;
+    2. ``gather`` key, for questions asked with ``gather=[keys]``;
+    3. prompt text, without surrounding whitespace or the default shown
+       after it (or, for a menu, its header).
+
+    :param answers: a list of answers by position; a dict whose keys are
+        positions (ints), gather keys or prompts; or the name of a JSON
+        file holding either.  As JSON keys are always strings, keys of
+        all digits in a JSON file are taken as positions.  A dict value may be a list, whose items
+        answer successive questions with that key, e.g. those asked by
+        ``gather=''``.  Answers are strings, as typed; numbers and bools
+        are accepted too, ``True`` and ``False`` meaning ``y`` and ``n``.
+    :param strict: if ``True``, a question with no answer raises
+        :py:class:`FeedError`; otherwise it is asked as usual.
+
+    ``answered`` lists ``(position, prompt, answer)`` for each question
+    answered from the feed.  Call :py:meth:`reset` to run the same
+    answers through another session.
+"""
+    def __init__(self, answers, strict=True):
+        if isinstance(answers, basestring):
+            import json
+            with open(answers) as f:
+                answers = json.load(f)
+            if isinstance(answers, dict):
+                answers = dict((int(k) if k.isdigit() else k, v)
+                               for (k, v) in answers.iteritems())
+        if isinstance(answers, (list, tuple)):
+            answers = dict(enumerate(answers))
+        self.answers = answers
+        self.strict = strict
+        self.reset()
+
+    def reset(self):
+        self.position = 0
+        self.answered = []
+        self._used = {} # key -> number of list items used
+
+    def _take(self, key):
+        try:
+            value = self.answers[key]
+        except (KeyError, TypeError): # TypeError: unhashable gather key
+            return _missing
+        if isinstance(value, list):
+            used = self._used.get(key, 0)
+            if used >= len(value):
+                return _missing
+            self._used[key] = used + 1
+            value = value[used]
+        return value
+
+    def lookup(self, q, position, prompt=None):
+        """The raw answer for ``q``, asked at ``position``, or ``None``."""
+        if prompt is None:
+            prompt = (q.base_prompt or '').strip()
+        header = getattr(q, 'header', None)
+        for key in (position, q.gather_key, prompt,
+                    header.strip() if header else None):
+            if key is not None:
+                value = self._take(key)
+                if value is not _missing:
+                    return value
+        return None
+
+    def ask(self, q):
+        """``q``'s answer, converted, or :py:data:`unanswered` if there is
+        none and the feed isn't strict."""
+        position = self.position
+        self.position += 1
+        prompt = (q.base_prompt or '').strip()
+        raw = self.lookup(q, position, prompt)
+        if raw is None:
+            if self.strict:
+                raise FeedError("no answer for question %d (%r)" %
+                                (position, prompt))
+            return unanswered
+        if raw is True or raw is False:
+            raw = 'y' if raw else 'n'
+        elif isinstance(raw, unicode):
+            raw = raw.encode('utf-8')
+        else:
+            raw = str(raw)
+        try:
+            ans = q.convert(q.answer_or_default(raw))
+        except BadAnswer, e:
+            raise FeedError("answer %r to question %d (%r) was rejected: %s" %
+                            (raw, position, prompt, e))
+        self.answered.append((position, prompt, raw))
+        return ans
@@ -27,9 +27,13 @@ def gather_string(s, pyl, q):
 def gather_dict(keys, pyl, q):
     answers = {}
     origprompt = q.prompt
-    for key in keys:
-        q.prompt = pyl.effectize_string(origprompt, keys={'key':key})
-        answers[key] = pyl.ask(q)
+    try:
+        for key in keys:
+            q.prompt = pyl.effectize_string(origprompt, keys={'key':key})
+            q.gather_key = key
+            answers[key] = pyl.ask(q)
+    finally:
+        q.gather_key = None
     return answers
 
 gather_dispatch = {
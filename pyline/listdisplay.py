@@ -1,6 +1,7 @@
 """Methods for laying out out items into a list.
 """
 
+from itertools import izip
 from utils import real_len
 
 def inline_simple(items, firstsep=None, finalsep=None):
@@ -33,28 +34,45 @@ def inline(pyl_unused, items, *args):
 def rows(pyl, items, *junk):
     return '\n'.join(items)
 
+def _width(item):
+    return real_len(item) if '\033' in item else len(item)
+
 def _columns_general(pyl, items, cols):
-    longest = len(max(items, key=real_len))
+    # visible widths are measured once; items containing escape codes are
+    # padded here, the rest by the row format (see _join_rows)
+    if not isinstance(items, list):
+        items = list(items)
+    if '\033' in ''.join(items):
+        widths = map(_width, items)
+        longest = max(widths)
+        items = [item if width == len(item) else item + ' ' * (longest - width)
+                 for (item, width) in izip(items, widths)]
+    else:
+        longest = max(map(len, items))
     if not cols:
-        cols = (pyl.wrap_at + 2) / (longest + 2)
-    items = ["{1:<{0}}".format(longest+(len(i)-real_len(i)), i) for i in items]
+        cols = max((pyl.wrap_at + 2) // (longest + 2), 1)
     count = len(items)
-    rows = count / cols + int(count % cols != 0)
-    return items, rows, cols
+    rows = count // cols + int(count % cols != 0)
+    return items, rows, cols, longest
+
+def _join_rows(rows, width):
+    formats = {}
+    out = []
+    for row in rows:
+        n = len(row)
+        fmt = formats.get(n)
+        if fmt is None:
+            fmt = formats[n] = '  '.join(['%%-%ds' % width] * n)
+        out.append(fmt % tuple(row))
+    return '\n'.join(out)
 
 def columns_down(pyl, items, *args):
     cols = args[0] if args else None
-    items, rows, cols = _columns_general(pyl, items, cols)
-    out = []
-    for i in range(rows):
-        out.append(items[i::rows])
-    return '\n'.join('  '.join(line) for line in out)
+    items, rows, cols, width = _columns_general(pyl, items, cols)
+    return _join_rows((items[i::rows] for i in xrange(rows)), width)
 
 def columns_across(pyl, items, *args):
     cols = args[0] if args else None
-    items, rows, cols = _columns_general(pyl, items, cols)
-    out = []
-    while items:
-        out.append(items[:cols])
-        items = items[cols:]
-    return '\n'.join('  '.join(line) for line in out)
+    items, rows, cols, width = _columns_general(pyl, items, cols)
+    return _join_rows((items[i:i+cols] for i in xrange(0, len(items), cols)),
+                      width)
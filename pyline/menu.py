@@ -9,6 +9,20 @@ INDEX, NAME, INDEX_OR_NAME = range(3)
 
 class MenuError(Exception): pass
 
+_letters = string.lowercase + string.uppercase
+
+def letter_key(pos):
+    """The letter index of the item at ``pos`` (counting from 0): ``a``
+    to ``z``, ``A`` to ``Z``, then ``aa``, ``ab``, ... ``ZZ``, ``aaa``
+    and so on.  This is bijective base 52, so no key is longer than it
+    needs to be."""
+    key = []
+    pos += 1
+    while pos:
+        pos, d = divmod(pos - 1, 52)
+        key.append(_letters[d])
+    return ''.join(reversed(key))
+
 class Layout(object):
     def __init__(self, flow=None, flowoption=None):
         self.flow = flow or rows
@@ -38,6 +52,46 @@ class MenuOnly(Layout):
     def __call__(self, menu):
         return menu.pyline.listdisplay(list(menu), self.flow, self.flowoption) + "\n" + menu.prompt
 
+class Window(Layout):
+    """Show ``size`` of the menu's items at a time (by default, as many
+    as fit on a page), starting at the menu's ``offset``.  Entering
+    ``>``/``<`` at the prompt pages forward/back, and ``+``/``-`` scroll
+    by one item (unless an item is selected by that key; the keys are
+    the attributes ``next_page``, ``prev_page``, ``scroll_down`` and
+    ``scroll_up``); items keep the index they have in the whole menu.  Only
+    the visible items are rendered, so redrawing costs the same however
+    many items the menu has.
+"""
+    next_page, prev_page, scroll_down, scroll_up = '>', '<', '+', '-'
+    def __init__(self, size=None, flow=None, flowoption=None):
+        Layout.__init__(self, flow, flowoption)
+        self.size = size
+    def window_size(self, menu):
+        return self.size or max(menu.pyline.page_at - 3, 1)
+    def navigate(self, menu, key):
+        size = self.window_size(menu)
+        moves = {self.next_page: size, self.prev_page: -size,
+                 self.scroll_down: 1, self.scroll_up: -1}
+        if key not in moves:
+            return False
+        menu.offset += moves[key]
+        return True
+    def __call__(self, menu):
+        size = self.window_size(menu)
+        count = len(menu.items)
+        menu.offset = start = max(min(menu.offset, count - size), 0)
+        stop = min(start + size, count)
+        r = [menu.header+":\n" if menu.header else '']
+        r.append(menu.pyline.listdisplay(menu.rendered(start, stop),
+                                         self.flow, self.flowoption))
+        r.append('\n')
+        if size < count:
+            r.append("(%d-%d of %d; %s %s to page, %s %s to scroll)\n" % \
+                     (start+1, stop, count, self.prev_page, self.next_page,
+                      self.scroll_up, self.scroll_down))
+        r.append(menu.prompt)
+        return ''.join(r)
+
 class Menu(Question):
     def __init__(self, items=None, hidden=None, index=None,
                  index_suffix=". ",
@@ -50,6 +104,10 @@ class Menu(Question):
 
         self.items = []
         self.hidden = []
+        self._trie = None
+        self._options = None
+        self._completions = None
+        self.offset = 0 # first item shown by a Window layout
         for i in items or []:
             self.add_choice(i)
         for i in hidden or []:
@@ -77,32 +135,52 @@ class Menu(Question):
         self.pyline = pyline
         
     def add_choice(self, choice):
+        self._add_choice(choice, False)
+    def _add_choice(self, choice, hidden):
         if isinstance(choice, tuple):
             choice = MenuChoice(*choice)
         elif not isinstance(choice, MenuChoice):
             choice = MenuChoice(choice)
-        if self.items and self.items[-1].name == 'help':
-            h = self.items.pop()
-            self.items.append(choice)
-            self.items.append(h)
+        fresh = self._trie is not None and \
+                self._trie_state == self._index_state()
+        items = self.hidden if hidden else self.items
+        added = [choice]
+        if items and items[-1].name == 'help':
+            h = items.pop()
+            items.append(choice)
+            items.append(h)
+            start = len(items) - 2
         else:
-            self.items.append(choice)
+            items.append(choice)
+            start = len(items) - 1
         if choice.help and not self.has_help_help:
             if choice.name != 'help':
-                self.items.append(MenuChoice('help',
-                                  action=self.choose_help,
-                                  help=self.__class__.default_help))
+                h = MenuChoice('help',
+                               action=self.choose_help,
+                               help=self.__class__.default_help)
+                items.append(h)
+                added.append(h)
             self.has_help_help = True
+        if fresh:
+            self._update_index(added, None if hidden else start)
     def add_choices(self, names, action=None):
         [self.add_choice(MenuChoice(name, action)) for name in names]
     def add_hidden(self, choice):
-        with reassigning(self, "items", self.hidden):
-            self.add_choice(choice)
+        self._add_choice(choice, True)
     def add_hiddens(self, names, action):
-        with reassigning(self, "items", self.hidden):
-            self.add_choices(names, action)
+        [self.add_hidden(MenuChoice(name, action)) for name in names]
 
     def options(self):
+        """Everything that can be entered to select a choice: proxies for
+        the index keys and/or the choices themselves.  The list is kept
+        until the menu's options change, and shouldn't be modified."""
+        state = self._index_state()
+        if self._options is None or self._options_state != state:
+            self._options = self._build_options()
+            self._options_state = state
+        return self._options
+
+    def _build_options(self):
         allitems = self.items + self.hidden
         if self.index not in (Menu._index_none, Menu._index_const_str):
             by_index = [ChoiceProxy(i, e) for (i,e) in zip(self.index(self),
@@ -115,6 +193,81 @@ class Menu(Question):
             return by_index
         return by_index + allitems
 
+    def _index_state(self):
+        return (self.index, self.select_by, self.shell,
+                len(self.items), len(self.hidden))
+
+    def _uses_index(self):
+        return self.index not in (Menu._index_none, Menu._index_const_str) \
+               and self.select_by != NAME and not self.shell
+
+    def _uses_names(self):
+        return self.select_by != INDEX or self.shell
+
+    def candidate_index(self):
+        """Prefix index over :py:meth:`options`.
+
+        The index is kept between questions and updated in place by
+        :py:meth:`add_choice` and :py:meth:`add_hidden`; it's rebuilt
+        if the index style, ``select_by``, ``shell``, or the number of
+        items changes behind the menu's back.
+"""
+        state = self._index_state()
+        if self._trie is None or self._trie_state != state:
+            options = self.options()
+            self._trie = Trie(options)
+            self._exact = {}
+            for o in options:
+                self._exact.setdefault(str(o), o)
+            self._trie_state = state
+        return self._trie
+
+    def completions(self):
+        """Sorted names of :py:meth:`options`, for completion; cached
+        until the menu's options change."""
+        state = self._index_state()
+        if self._completions is None or self._completions_state != state:
+            self._completions = sorted(map(str, self.options()))
+            self._completions_state = state
+        return self._completions
+
+    def _update_index(self, added, start):
+        # start is the first position in self.items whose index key
+        # changed, or None if only hidden choices were added.
+        if start is not None and self._uses_index():
+            keys = self._index_keys(start, len(self.items))
+            for (key, choice) in zip(keys, self.items[start:]):
+                proxy = ChoiceProxy(key, choice)
+                self._trie.insert(key, proxy, replace=True)
+                self._exact[key] = proxy
+        if self._uses_names():
+            for choice in added:
+                self._trie.insert(str(choice), choice)
+                self._exact.setdefault(str(choice), choice)
+        self._trie_state = self._index_state()
+
+    def _index_keys(self, start, stop):
+        if self.index == Menu._index_number:
+            return [str(pos+1) for pos in xrange(start, stop)]
+        if self.index == Menu._index_letter:
+            return map(letter_key, xrange(start, min(stop, len(self.items))))
+        return map(str, itertools.islice(self.index(self), start, stop))
+
+    def index_key(self, pos):
+        """The index shown before the item at ``pos`` in :py:attr:`items`."""
+        keys = self._index_keys(pos, pos+1)
+        return keys[0] if keys else ''
+
+    def rendered(self, start=0, stop=None):
+        """The items from ``start`` to ``stop`` as they're displayed, with
+        their index."""
+        items = self.items[start:stop]
+        keys = self._index_keys(start, start + len(items))
+        effectize = self.pyline.effectize_string
+        suffix = self.index_suffix
+        return ["%s%s%s" % (prefix, suffix if prefix else '', effectize(str(i)))
+                for (prefix, i) in zip(keys, items)]
+
     def choose_help(self, chosen, mn, line):
         line = line.strip()
         res = self.items[-1] if self.items[-1].name == 'help' else self.hidden[-1]
@@ -153,9 +306,23 @@ self.pyline.listdisplay(self.helptopics(), columns_across))
             return None
         return r
 
+    def navigate(self, ans):
+        navigate = getattr(self.layout, 'navigate', None)
+        if navigate is None or isinstance(self.answer, MenuHelpAnswer):
+            return False
+        self.candidate_index()
+        if ans in self._exact: # the items' own keys win
+            return False
+        return navigate(self, ans)
+
     def winnow(self, candidates, answergiven):
         if self.shell or answergiven.startswith('help '):
             answergiven = answergiven.split(' ')[0]
+        if candidates is self._trie:
+            # an exact match wins even if it's also a prefix ("1" of "10")
+            exact = self._exact.get(answergiven)
+            if exact is not None:
+                return exact
         return Question.winnow(self, candidates, answergiven)
 
     def _get_index(self):
@@ -179,8 +346,8 @@ self.pyline.listdisplay(self.helptopics(), columns_across))
         for i in range(len(self.items)):
             yield i+1
     def _index_letter(self):
-        for (c,e) in zip(string.lowercase+string.uppercase, self.items):
-            yield c
+        for pos in xrange(len(self.items)):
+            yield letter_key(pos)
     def _index_none(self):
         return ('' for i in self.items)
     def _index_const_str(self):
@@ -188,9 +355,7 @@ self.pyline.listdisplay(self.helptopics(), columns_across))
         return (self.idxstr for i in self.items)
 
     def __iter__(self):
-        for (prefix,i) in zip(self.index(self), self.items):
-            suffix = self.index_suffix if prefix else ''
-            yield "%s%s%s" % (prefix,suffix,self.pyline.effectize_string(str(i)))
+        return iter(self.rendered())
     
     def __str__(self):
         if hasattr(self.layout, "__call__"):
@@ -202,18 +367,19 @@ letter = Menu._index_letter
 noindex = Menu._index_none
 
 class ChoiceProxy(object):
+    __slots__ = ('i', 'obj')
     def __init__(self, i, obj):
         self.i = str(i)
         self.obj = obj
     def __str__(self): return self.i
     def __call__(self, *a): return self.obj(*a)
-    def __getattribute__(self, k):
-        if k not in ('i', 'obj', '__str__'):
-            return getattr(self.obj, k)
-        return object.__getattribute__(self, k)
+    def __getattr__(self, k):
+        # only called for attributes the proxy doesn't have itself
+        return getattr(self.obj, k)
     
 
 class MenuChoice(object):
+    __slots__ = ('name', 'help', 'action') # menus can have very many
     def __init__(self, name, action=None, help=''):
         self.name = name
         self.help = help
@@ -0,0 +1,270 @@
+"""Page through large files without reading them into memory.
+
+The file is memory-mapped, and the offsets at which its lines start are
+found by a background thread, so the first page can be shown at once;
+commands that need part of the file not yet indexed wait for it.
+"""
+import re, os, mmap, array, bisect, threading
+from . import utils
+
+class LineIndex(object):
+    """Offsets of the starts of the lines in ``data`` (a string or mmap),
+    found ``chunk`` bytes at a time, either by calling :py:meth:`build`
+    or in a background thread started by :py:meth:`start`.
+"""
+    chunk = 1 << 20
+    _newline = re.compile('\n')
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.offsets = array.array('L', [0] if self.size else [])
+        self.scanned = 0 # offsets of lines starting before this are known
+        self.done = not self.size
+        self.error = None
+        self.cond = threading.Condition()
+        self.thread = None
+        self._stop = False
+
+    def start(self):
+        self.thread = threading.Thread(target=self.build, name="pyline-line-index")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self._stop = True
+        if self.thread is not None:
+            self.thread.join()
+
+    def build(self):
+        try:
+            data, size, pos = self.data, self.size, self.scanned
+            while pos < size and not self._stop:
+                end = min(pos + self.chunk, size)
+                found = [m.end() + pos for m in
+                         self._newline.finditer(data[pos:end])]
+                if found and found[-1] == size:
+                    found.pop() # trailing newline doesn't start a line
+                with self.cond:
+                    self.offsets.extend(found)
+                    self.scanned = pos = end
+                    self.cond.notify_all()
+        except Exception, e:
+            self.error = e
+            raise
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def _wait(self, ready):
+        with self.cond:
+            while not (self.done or ready()):
+                self.cond.wait()
+            if self.error is not None:
+                raise self.error
+
+    def __len__(self):
+        """Number of lines, waiting for the whole file to be indexed."""
+        self._wait(lambda: False)
+        return len(self.offsets)
+
+    def known(self):
+        """``(lines found so far, True if that is all of them)``"""
+        with self.cond:
+            return len(self.offsets), self.done
+
+    def span(self, n):
+        """``(start, end)`` offsets of line ``n`` (0-based), excluding its
+        newline, or ``None`` if there is no such line."""
+        self._wait(lambda: len(self.offsets) > n + 1)
+        with self.cond:
+            if n >= len(self.offsets):
+                return None
+            start = self.offsets[n]
+            end = self.offsets[n+1] - 1 if n + 1 < len(self.offsets) else self.size
+        if end == self.size and self.data[end-1:end] == '\n':
+            end -= 1
+        return start, end
+
+    def line_at(self, offset):
+        """Number of the line containing byte ``offset``."""
+        self._wait(lambda: self.scanned > offset)
+        with self.cond:
+            return max(bisect.bisect_right(self.offsets, offset) - 1, 0)
+
+class Pager(object):
+    """Interactive pager over a file, shown ``pyline.page_at`` rows at a
+    time and wrapped at ``pyline.wrap_at`` columns.
+
+    ``f`` is a filename or a file object with a real file descriptor.  After
+    each page the user may enter one of:
+
+    * enter or ``f``: next page
+    * ``b``: previous page
+    * ``g`` / ``G``: first / last page
+    * ``NN%``: the line at NN percent of the way through the file
+    * ``NN``: line NN
+    * ``/regexp``: the next line matching ``regexp``; ``n`` repeats the search
+    * ``q``: quit
+"""
+    commands = "enter/f b g G NN% NN /re n q"
+
+    def __init__(self, pyline, f, background=True):
+        self.pyline = pyline
+        if isinstance(f, basestring):
+            f = open(f, 'rb')
+            self._opened = f
+        else:
+            self._opened = None
+        size = os.fstat(f.fileno()).st_size
+        self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else ''
+        self.index = LineIndex(self.data)
+        if background:
+            self.index.start()
+        else:
+            self.index.build()
+        self.top = 0 # the page starts at row skip of line top,
+        self.skip = 0 # as wrapped
+        self.next = (0, 0) # where the page after it starts
+        self.search = None
+        self.message = None
+
+    def close(self):
+        self.index.stop()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._opened:
+            self._opened.close()
+
+    def line(self, n):
+        span = self.index.span(n)
+        if span is None:
+            return None
+        start, end = span
+        return self.data[start:end].rstrip('\r')
+
+    def rows(self, n):
+        """Line ``n`` wrapped, or ``None`` if there is no such line."""
+        line = self.line(n)
+        if line is None:
+            return None
+        return utils.wrap(line, self.pyline.wrap_at) or ['']
+
+    def render(self):
+        """Text of the page starting at row ``self.skip`` of line
+        ``self.top``.  A line too long for the rest of the page is
+        continued on the next one."""
+        rows = []
+        n, skip = self.top, self.skip
+        page_at = self.pyline.page_at
+        while len(rows) < page_at:
+            wrapped = self.rows(n)
+            if wrapped is None:
+                break
+            taken = wrapped[skip:skip + page_at - len(rows)]
+            rows.extend(taken)
+            if skip + len(taken) < len(wrapped):
+                skip += len(taken)
+                break
+            n, skip = n + 1, 0
+        self.next = (n, skip)
+        return '\n'.join(rows)
+
+    def rows_before(self, n, skip, count):
+        """The ``(line, row)`` ``count`` rows before row ``skip`` of
+        line ``n``, or the first row."""
+        while count > skip and n > 0:
+            count -= skip
+            n -= 1
+            skip = len(self.rows(n))
+        return n, max(skip - count, 0)
+
+    def status(self):
+        count, done = self.index.known()
+        n, skip = self.next
+        last = n + 1 if skip else n # partly shown counts
+        following = self.index.span(last)
+        pct = 100 * following[0] // self.index.size if following else 100
+        return "-- lines %d-%d of %d%s (%d%%) -- " % (
+            self.top + 1, last, count, '' if done else '+', pct)
+
+    def goto(self, n):
+        """Show line ``n`` at the top, or the last page if there's no
+        such line."""
+        if n < 0:
+            n = 0
+        if self.index.span(n) is None:
+            self.last_page()
+        else:
+            self.top, self.skip = n, 0
+
+    def last_page(self):
+        self.top, self.skip = self.rows_before(len(self.index), 0,
+                                               self.pyline.page_at)
+
+    def find(self, pattern, start):
+        match = pattern.search(self.data, start)
+        if match is None:
+            self.message = "Pattern not found"
+            return
+        self.goto(self.index.line_at(match.start()))
+
+    def command(self, cmd):
+        """Carry out ``cmd``; return ``False`` if the pager should exit."""
+        if cmd in ('', 'f'):
+            if self.index.span(self.next[0]) is not None:
+                self.top, self.skip = self.next
+        elif cmd == 'b':
+            self.top, self.skip = self.rows_before(self.top, self.skip,
+                                                   self.pyline.page_at)
+        elif cmd == 'g':
+            self.goto(0)
+        elif cmd == 'G':
+            self.last_page()
+        elif cmd.endswith('%') and cmd[:-1].isdigit():
+            pct = min(int(cmd[:-1]), 100)
+            self.goto(self.index.line_at(self.index.size * pct // 100))
+        elif cmd.isdigit():
+            self.goto(int(cmd) - 1)
+        elif cmd.startswith('/') or cmd == 'n':
+            if cmd != 'n':
+                try:
+                    self.search = re.compile(cmd[1:], re.M)
+                except re.error, e:
+                    self.message = "Bad pattern: %s" % e
+                    return True
+            if self.search is None:
+                self.message = "No previous search"
+                return True
+            span = self.index.span(self.top + 1)
+            if span is None:
+                self.message = "Pattern not found"
+            else:
+                self.find(self.search, span[0])
+        elif cmd == 'q':
+            return False
+        else:
+            self.message = "Commands: %s" % self.commands
+        return True
+
+    def run(self):
+        """Page through the file until the user quits or input runs out."""
+        out = self.pyline.out
+        try:
+            while True:
+                page = self.render()
+                if page:
+                    out.write(page)
+                    out.write('\n')
+                if self.message:
+                    out.write(self.message + '\n')
+                    self.message = None
+                try:
+                    cmd = self.pyline.ask(prompt=self.status())
+                except EOFError:
+                    break
+                if not self.command(cmd):
+                    break
+        finally:
+            self.close()
@@ -0,0 +1,175 @@
+"""Live progress display: one line per bar, redrawn in place.
+
+See :py:meth:`PyLine.progress`.
+"""
+import time, thread
+from . import colors
+
+def format_duration(seconds):
+    seconds = int(seconds + 0.5)
+    h, m, s = seconds // 3600, seconds // 60 % 60, seconds % 60
+    if h:
+        return "%d:%02d:%02d" % (h, m, s)
+    return "%d:%02d" % (m, s)
+
+def format_rate(rate):
+    if rate >= 100:
+        return "%.0f/s" % rate
+    return "%.1f/s" % rate
+
+class Bar(object):
+    """One line of a :py:class:`Progress` display: ``count`` of ``total``
+    (if known) done, plus any named ``counters`` and a ``status`` text.
+"""
+    def __init__(self, progress, label, total=None):
+        self.progress = progress
+        self.label = label
+        self.total = total
+        self.count = 0
+        self.counters = {}
+        self.status = ''
+        self.started = progress.clock()
+
+    def update(self, n=1, status=None, **counters):
+        """Count ``n`` more done, and add ``counters`` (e.g. ``errors=1``) to
+        the named counters.  The display is redrawn if it's time for a new
+        frame; otherwise the update shows in the next one."""
+        with self.progress.lock:
+            self.progress.updates += 1
+            self.count += n
+            for (k, v) in counters.iteritems():
+                self.counters[k] = self.counters.get(k, 0) + v
+            if status is not None:
+                self.status = status
+        self.progress.changed()
+
+    def rate(self, now):
+        elapsed = now - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, now):
+        """Seconds until ``total`` is reached at the rate so far, or ``None``."""
+        rate = self.rate(now)
+        if self.total is None or not rate:
+            return None
+        return max(self.total - self.count, 0) / rate
+
+    def render(self, now, width, graphic=True):
+        """The bar's line, no wider than ``width``; with a graphic bar if
+        ``graphic`` and there's room."""
+        info = ["%d/%d" % (self.count, self.total) if self.total is not None
+                else "%d" % self.count]
+        if self.total:
+            info.append("%d%%" % (100 * self.count // self.total))
+        info.append(format_rate(self.rate(now)))
+        eta = self.eta(now)
+        if eta is not None:
+            info.append("ETA " + format_duration(eta))
+        info.extend("%s=%s" % kv for kv in sorted(self.counters.items()))
+        if self.status:
+            info.append(self.status)
+        info = ' '.join(info)
+        room = width - len(self.label) - len(info) - 4
+        if graphic and self.total and room >= 10:
+            done = min(room * self.count // self.total, room)
+            line = "%s [%s%s] %s" % (self.label, '#' * done, '.' * (room - done), info)
+        else:
+            line = "%s: %s" % (self.label, info)
+        return line[:width]
+
+class Progress(object):
+    """Progress display over ``pyline.out``, with any number of bars (see
+    :py:meth:`bar`).
+
+    On a terminal, the bars are redrawn in place, at most ``fps`` times a
+    second however often they are updated; updates in between are
+    merged into the next frame.  Otherwise (or if ``tty`` is ``False``)
+    a plain line per bar is written every ``interval`` seconds.  The last
+    state is always shown by :py:meth:`close`, which is called on leaving
+    a ``with`` block.  ``clock`` gives the time in seconds.
+
+    Bars may be updated from any thread, and updating never waits for
+    output: while other output is being written, or a question asked,
+    frames are skipped.  Other output shouldn't be written while the
+    display is open, since it would be drawn over.
+"""
+    def __init__(self, pyline, fps=10, interval=10.0, tty=None, clock=time.time):
+        self.pyline = pyline
+        self.clock = clock
+        if tty is None:
+            tty = pyline.out.isatty()
+        self.tty = tty
+        self.period = 1.0 / fps if tty else interval
+        self.bars = []
+        self.lock = thread.allocate_lock()
+        self.frames = 0
+        self.updates = 0 # to bars, so far
+        self.shown = None # updates shown by the last frame
+        self.drawn = 0 # lines on screen from the last frame
+        self.last_frame = None
+        self.closed = False
+        # just the codes: frames are redrawn often, so keep them short
+        self._erase = '\r' + colors.e.erase_line.code
+        self._up = colors.e.cursor_up.code
+
+    def bar(self, label, total=None):
+        """Add a bar labelled ``label``, counting up to ``total`` if given."""
+        b = Bar(self, label, total)
+        with self.lock:
+            self.updates += 1
+            self.bars.append(b)
+        self.changed()
+        return b
+
+    def _due(self, now):
+        return self.last_frame is None or now - self.last_frame >= self.period
+
+    def changed(self):
+        now = self.clock()
+        if not self._due(now):
+            return
+        # if output is busy, this update is shown by a later frame
+        lock = self.pyline.output_lock
+        if not lock.acquire(False):
+            return
+        try:
+            if self._due(now) and not self.pyline.question_lock.theirs():
+                self.draw(now) # unless another thread just drew it
+        finally:
+            lock.release()
+
+    def frame(self, now):
+        """Text that draws the bars as they are at ``now``."""
+        width = self.pyline.wrap_at - 1 # writing the last column may wrap
+        with self.lock:
+            lines = [b.render(now, width, self.tty) for b in self.bars]
+            self.shown = self.updates
+        if not self.tty:
+            return ''.join(line + '\n' for line in lines)
+        text = [self._up * self.drawn]
+        text.extend(self._erase + line + '\n' for line in lines)
+        self.drawn = len(lines)
+        return ''.join(text)
+
+    def draw(self, now=None):
+        if now is None:
+            now = self.clock()
+        with self.pyline.output_lock:
+            if self.closed:
+                return
+            self.last_frame = now
+            self.frames += 1
+            self.pyline._emit(self.frame(now))
+
+    def close(self):
+        """Show the final state of the bars (unless the last frame did),
+        and stop updating them."""
+        if not self.closed:
+            if self.shown != self.updates:
+                self.draw()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
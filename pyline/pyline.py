@@ -1,10 +1,12 @@
 """Main interface to PyLine.
 """
+import re
 import sys
-import textwrap
-import readline
+import bisect
+import contextlib
 from . import question
 from . import colors
+from . import system
 from .system import *
 from .listdisplay import *
 from .answers import *
@@ -13,20 +15,44 @@ from . import utils
 from .menu import *
 from . import menu
 from .gather import gather_dispatch
+from .feed import AnswerFeed, FeedError, unanswered
+
+def _readline():
+    # imported when stdin is first read from: importing it is what turns
+    # on line editing for raw_input(), and it's slow to import
+    import readline
+    return readline
 
 def get_completer():
-    return readline.get_completer()
+    return _readline().get_completer()
 def clear_completer():
-    readline.set_completer()
-def set_completer(choices):
-    choices = sorted(map(str,choices))
-    def completer(txt, state):
+    _readline().set_completer()
+def set_completer(choices, presorted=False, limit=None):
+    if not presorted:
+        choices = sorted(map(str,choices))
+    _readline().set_completer(Completer(choices, limit))
+
+class Completer(object):
+    """readline completion function over a sorted list of strings.
+
+    The start of the matching range is found by binary search when
+    completion begins (``state == 0``); each later call returns the next
+    match, so no more than ``limit`` matches are ever produced.
+"""
+    limit = 1000
+    def __init__(self, choices, limit=None):
+        self.choices = choices
+        if limit is not None:
+            self.limit = limit
+        self.start = 0
+    def __call__(self, txt, state):
         if state == 0:
-            completer.options = [c for c in choices if c.startswith(txt)]
-        if state < len(completer.options):
-            return completer.options[state]
+            self.start = bisect.bisect_left(self.choices, txt)
+        i = self.start + state
+        if state < self.limit and i < len(self.choices) and \
+           self.choices[i].startswith(txt):
+            return self.choices[i]
         return None
-    readline.set_completer(completer)
 
 
 class PyLine(object):
@@ -40,26 +66,61 @@ class PyLine(object):
     * page_at: row number at which to prompt the user to page output. (Default: number of rows - 2)
     * colors: True if output should be colorized, False otherwise. 
     * colorscheme: custom :py:class:`ColorScheme` to use in colorizing output, or ``None`` to use the default. 
+    * track_size: True if ``cols``/``rows``, and so the default ``wrap_at``/``page_at``, should follow the terminal as it's resized rather than keep the size it had when the PyLine was created.
+    * size: ``(columns, rows)`` of the user's terminal, if it can't be found from ``out`` (e.g. as told by a remote client).
+    * feed: an :py:class:`AnswerFeed` (or the answers to make one from) to answer questions from instead of asking the user. Questions it answers aren't shown, and output isn't paged.
+
+    Colorized output has its escape codes merged and redundant ones dropped (see :py:func:`colors.optimize_sgr`); ``sgr_bytes_saved`` counts the bytes this has saved.
 
-    If :py:func:`out.isatty` returns ``True``, we attempt to determine the actual terminal size; otherwise, 80 columns and 24 rows are assumed.
+    Output is thread-safe: each :py:meth:`say` is written in one piece.  While a question is asked (or output paged), what other threads say is held back, unpaged, and written once it's over.  They don't wait for it, unless ``max_held`` texts (1024 by default) are held already: then :py:meth:`say` waits until the question has been answered, so that held output can't grow without bound.  Asking a question of their own, :py:meth:`say_stream`, :py:meth:`say_file` and :py:meth:`page_file` always wait.  See also :py:meth:`background_output`.
+
+    If ``size`` isn't given and :py:func:`out.isatty` returns ``True``, we attempt to determine the actual terminal size (see :py:func:`system.terminal_size`); otherwise, 80 columns and 24 rows are assumed.
 
     """
+    max_held = 1024 # see above
     def __init__(self, out=None, inp=None, wrap_at=None,
-                 page_at=None, colors=True, colorscheme=None):
-        self.wrap_at = wrap_at
+                 page_at=None, colors=True, colorscheme=None,
+                 track_size=False, size=None, feed=None):
         self.out = out or sys.stdout
         self.inp = inp or sys.stdin
         self.colors = colors# if self.inp.isatty() else False
-        self.cols, self.rows = self.dimensions()
+        self.track_size = track_size
+        self.size = size
+        self._dimensions = self.dimensions()
         self.colorscheme = colorscheme
-        self.page_at = page_at or self.rows - 2
-        self.wrap_at = wrap_at or self.cols
+        self.page_at = page_at
+        self.wrap_at = wrap_at
+        self.sgr_bytes_saved = 0 # see effectize_string
+        self.pending_input = '' # see input_session
+        self.output_lock = utils.ReentrantLock() # held while writing
+        self.question_lock = utils.ReentrantLock() # see _hold_output
+        self._held = [] # said by other threads during a question
+        self.writer = None # see background_output
+        if feed is not None and not isinstance(feed, AnswerFeed):
+            feed = AnswerFeed(feed)
+        self.feed = feed
 
     def dimensions(self):
+        if self.size is not None:
+            return self.size
         if self.out.isatty():
-            return terminal_size()
+            return terminal_size(self.out)
         return (80, 24)
 
+    def _current_dimensions(self):
+        if self.track_size:
+            return self.dimensions()
+        return self._dimensions
+    cols = property(lambda self: self._current_dimensions()[0])
+    rows = property(lambda self: self._current_dimensions()[1])
+
+    def _set_wrap_at(self, wrap_at):
+        self._wrap_at = wrap_at
+    def _set_page_at(self, page_at):
+        self._page_at = page_at
+    wrap_at = property(lambda self: self._wrap_at or self.cols, _set_wrap_at)
+    page_at = property(lambda self: self._page_at or self.rows - 2, _set_page_at)
+
     def y_or_n_style_q(self, prompt, acceptable_answers):
         """Ask the user a question, with nonblocking input, no echoing, selecting one of a set of answers. The question is repeated on erroneous input.
 
@@ -108,6 +169,7 @@ class PyLine(object):
                               case=question.downcase,
                               character=character,
                               default=default)
+        q.base_prompt = prompt
         return self.ask(question=q, answer=ans)
     def y_or_n_q(self, prompt):
         """Alias for ``agree(prompt, character=True)``
@@ -125,14 +187,150 @@ class PyLine(object):
         s = self.effectize_string(s, vals, keys)
         s, ws = utils.remove_capture_whitespace(s)
         lines = s.split('\n')
-        lines = ['\n'.join(textwrap.wrap(s, self.wrap_at)) for s in lines]
-        remaining = self.page(lines)
-        remaining = '\n'.join(remaining)+ws
-        self.out.write(remaining)
-        if remaining[-1] not in '\t ':
-            self.out.write('\n')
+        lines = ['\n'.join(utils.wrap(s, self.wrap_at)) for s in lines]
+        if self.writer is not None and not self.question_lock.mine():
+            # see background_output: queued, and not paged
+            self.writer.put(self._said(lines, ws))
+            return
+        if len(lines) <= self.page_at or self.question_lock.theirs():
+            # nothing to page; or held back, unpaged, until another
+            # thread's question has been answered
+            self._emit(self._said(lines, ws))
+            return
+        with self._hold_output():
+            self._emit(self._said(self.page(lines), ws))
+
+    def _said(self, lines, ws):
+        said = '\n'.join(lines) + ws
+        if not said or said[-1] not in '\t ':
+            said += '\n'
+        return said
+
+    def _write(self, s):
+        self.out.write(s)
         self.out.flush()
 
+    def _emit(self, s):
+        # write s, unless another thread is asking a question: then keep
+        # it until the question has been answered, or if too much is kept
+        # already, wait for that
+        with self.output_lock:
+            if not self.question_lock.theirs():
+                self._write(s)
+                return
+            if len(self._held) < self.max_held:
+                self._held.append(s)
+                return
+        if self.output_lock.mine():
+            # still held by our caller: the question can't finish while
+            # we wait, so keep it anyway
+            with self.output_lock:
+                self._held.append(s)
+            return
+        self.question_lock.acquire()
+        try:
+            self._emit(s)
+        finally:
+            self._release_question()
+
+    def _release_question(self):
+        # on answering the question, write what was held back meanwhile
+        with self.output_lock:
+            self.question_lock.release()
+            if self._held and not self.question_lock.mine():
+                held = ''.join(self._held)
+                del self._held[:]
+                self._write(held)
+
+    @contextlib.contextmanager
+    def _hold_output(self):
+        # for asking a question or paging: what was said before it is
+        # written first, and what other threads say meanwhile is held
+        # back until it's over (see _emit).  Meanwhile this thread alone
+        # writes to out, so it may write directly.
+        if self.writer is not None and not self.question_lock.mine():
+            self.writer.flush()
+        self.question_lock.acquire()
+        try:
+            with self.output_lock:
+                pass # until any write begun by another thread is done
+            yield
+        finally:
+            self._release_question()
+
+    @contextlib.contextmanager
+    def background_output(self, maxsize=1024):
+        """
+Context manager: on entry, :py:meth:`say` no longer writes its text but
+queues it for a thread that writes it in the background, so threads
+reporting progress aren't held up by a slow terminal.  ``maxsize`` texts
+at most are queued; beyond that, :py:meth:`say` waits.  Text said this
+way isn't paged.  Questions are still asked straight away: everything
+said before one is written first, and output queued while it is being
+asked is held back until it has been answered.  On exit, everything
+queued is written. ::
+
+    with p.background_output():
+        for job in jobs:
+            pool.apply_async(job, (p,))   # jobs call p.say()
+        [...]
+"""
+        from .writer import BackgroundWriter
+        writer = self.writer = BackgroundWriter(self, maxsize)
+        try:
+            yield writer
+        finally:
+            self.writer = None
+            writer.stop()
+
+    def say_stream(self, chunks, effectize=False):
+        """Write text as it arrives, wrapping and paging it line by line.
+
+        :param chunks: iterable of strings, e.g. a generator; they need not be split on line boundaries.
+        :param effectize: ``True`` to format each line as :py:meth:`say` does (so braces must be escaped), ``False`` to write the text as is.
+
+        Unlike :py:meth:`say`, the text is never held in memory all at once, so arbitrarily large output can be written; each page is shown as soon as it is complete. If the user stops paging, the rest of ``chunks`` is not consumed.
+"""
+        page_at = self.page_at
+        wrap_at = self.wrap_at
+        write = self.out.write
+        rows = 0
+        with self._hold_output():
+            for line in utils.iter_lines(chunks):
+                if effectize:
+                    line = self.effectize_string(line)
+                for row in utils.wrap(line, wrap_at) or ['']:
+                    if rows == page_at:
+                        if not self._continue_paging():
+                            write("...\n")
+                            self.out.flush()
+                            return
+                        rows = 0
+                    write(row)
+                    write('\n')
+                    rows += 1
+            self.out.flush()
+
+    def say_file(self, f, bufsize=65536):
+        """Write the contents of the file object ``f`` with :py:meth:`say_stream`, reading ``bufsize`` bytes at a time.
+"""
+        return self.say_stream(iter(lambda: f.read(bufsize), ''))
+
+    def progress(self, **k):
+        """A live progress display with one or more bars, redrawn in place
+        at a limited frame rate; see :py:class:`progress.Progress` for the
+        keyword arguments. ::
+
+    with p.progress(fps=10) as progress:
+        files = progress.bar("files", total=len(names))
+        for name in names:
+            copy(name)
+            files.update(status=name)
+
+"""
+        from .progress import Progress
+        return Progress(self, **k)
+
     def no_colors(self):
         """
 Context manager: on entry, output will no longer be colorized. ::
@@ -148,9 +346,15 @@ Context manager: on entry, output will no longer be colorized. ::
         return utils.reassigning(self, "colors", False)
 
     def effectize_string(self, s, vals=None, keys=None):
+        if '{' not in s and '}' not in s and '\033' not in s:
+            return s
         keys = keys or {}
         vals = vals or ()
-        return utils.effectize_string(s, vals, keys, self.colorscheme if self.colors else colors.none)
+        if not self.colors:
+            return utils.effectize_string(s, vals, keys, colors.none)
+        s, saved = utils.effectize_merged(s, self.colorscheme, vals, keys)
+        self.sgr_bytes_saved += saved
+        return s
 
     def ask(self, question=None, prompt=None, answer=None, **k):
         """The most general method for asking a question.
@@ -163,10 +367,19 @@ Context manager: on entry, output will no longer be colorized. ::
         
 """
         q = self._prep_question(question, prompt, answer, **k)
-        if q.gather is not False:
-            return self.do_gather(q)
-        self._say_question(q)
-        return self._answer_question(q)
+        with self._hold_output():
+            if q.gather is not False:
+                return self.do_gather(q)
+            ans = self._fed_answer(q)
+            if ans is not unanswered:
+                return ans
+            self._say_question(q)
+            return self._answer_question(q)
+
+    def _fed_answer(self, q):
+        if self.feed is None or q.first_answer:
+            return unanswered
+        return self.feed.ask(q)
 
     def _say_question(self, q):
         self.say(str(q))
@@ -182,6 +395,9 @@ Context manager: on entry, output will no longer be colorized. ::
         while 1:
             answer = self.get_response(q)
             answer = q.answer_or_default(answer)
+            if q.navigate(answer):
+                self._say_question(q)
+                continue
             try:
                 ans = q.convert(answer)
             except BadAnswer, e:
@@ -205,42 +421,57 @@ Context manager: on entry, output will no longer be colorized. ::
     def get_response(self, q):
         if q.first_answer:
             return q.get_first_answer()
+        with self._hold_output(): # for the echo
+            return self._get_response(q)
+
+    def _get_response(self, q):
         if not q.character:
             if q.echo == True and not q.limit:
                 return self.get_line(q)
+            erase = utils.effectize_string("\b{0.erase_char}")
             line = []
-            line_length = 0
-            while 1:
-                ch = get_character(self.inp)
-                if not ch:
-                    raise EOFError
-                o = ord(ch)
-                if o in (10,13): break
-                if not (o == 127 or o == 8):
-                    line.append(ch)
-                    line_length += 1
-                    if q.echo == True:
-                        self.out.write(ch)
-                    elif q.echo != False:
-                        self.out.write(q.echo)
-                else:
-                    if line_length:
-                        if q.echo:
-                            self.out.write(utils.effectize_string("\b{0.erase_char}"))
-                        line_length -= 1
-                        line.pop()
-                if q.limit and line_length == q.limit:
-                    break
-                self.out.flush()
+            echoed = []
+            with self.input_session() as keys:
+                while 1:
+                    # ordinary characters are taken a run at a time, so a
+                    # whole line of piped or pasted input is handled at once
+                    run = keys.read_run(q.limit - len(line) if q.limit else None)
+                    if run:
+                        line.extend(run)
+                        if q.echo == True:
+                            echoed.append(run)
+                        elif q.echo != False:
+                            echoed.append(q.echo * len(run))
+                    else:
+                        ch = keys.read()
+                        if not ch:
+                            raise EOFError
+                        if ch in '\r\n': break
+                        if line: # backspace or delete
+                            if q.echo:
+                                echoed.append(erase)
+                            line.pop()
+                    if q.limit and len(line) == q.limit:
+                        break
+                    # echo everything typed (or pasted) so far at once
+                    if echoed and not keys.waiting():
+                        self.out.write(''.join(echoed))
+                        self.out.flush()
+                        del echoed[:]
+            self.out.write(''.join(echoed))
             if q.overwrite:
                 self.out.write(utils.effectize_string("\r{0.erase_line}"))
                 self.out.flush()
             else: self.out.write('\n')
             return ''.join(line)
         elif q.character == question.getc:
+            if self.pending_input:
+                ch, self.pending_input = self.pending_input[0], self.pending_input[1:]
+                return ch
             return question.getc(self.inp)
         else:
-            response = get_character(self.inp)
+            with self.input_session() as keys:
+                response = keys.read()
             if not response:
                 raise EOFError
             if q.overwrite:
@@ -253,23 +484,50 @@ Context manager: on entry, output will no longer be colorized. ::
                     self.out.write(q.echo)
             return q.case(response)                            
 
+    @contextlib.contextmanager
+    def input_session(self):
+        """Context manager for reading one question's worth of keystrokes:
+        yields a :py:class:`system.CharReader`, which puts a terminal into
+        raw mode for the duration.  Input it reads ahead (e.g. the rest of
+        a paste) is kept for the next question.
+"""
+        keys = system.input_session(self.inp, self.pending_input)
+        self.pending_input = ''
+        with keys:
+            try:
+                yield keys
+            finally:
+                self.pending_input = keys.unread()
+
     def get_line(self, q=None):
+        pending = self.pending_input
+        if pending:
+            # typed ahead during an earlier raw-mode question, unechoed
+            self.pending_input = ''
+            m = re.search('[\r\n]', pending)
+            if m:
+                self.pending_input = pending[m.end():]
+                self.out.write(pending[:m.start()] + '\n')
+                return pending[:m.start()]
+            self.out.write(pending)
+            self.out.flush()
         ## uncertain about python's readline module: ignore it for now.
         if self.inp == sys.stdin:
+            _readline()
             set_here = False
             if q:
-                cands = q.answer.get_candidates()
+                cands = q.answer.get_completions()
                 if cands and not get_completer():
                     set_here = True
-                    set_completer(map(str,cands))
+                    set_completer(cands, presorted=True)
             line = raw_input()
             if set_here:
                 clear_completer()
-            return line
+            return pending + line
         else:
             line = self.inp.readline()
             if not line: raise EOFError
-            return line
+            return pending + line
 
     def choose(self, *items_or_menu, **k):
         """Make a choice from a menu.
@@ -300,8 +558,11 @@ Context manager: on entry, output will no longer be colorized. ::
         try:
             while True:
                 m.selected(res)
-                self.say(m.prompt)
-                res = self._answer_question(m)
+                with self._hold_output():
+                    res = self._fed_answer(m)
+                    if res is unanswered:
+                        self.say(m.prompt)
+                        res = self._answer_question(m)
         except ShellExit:
             pass
             
@@ -309,15 +570,14 @@ Context manager: on entry, output will no longer be colorized. ::
     def listdisplay(self, items, mode=None, *args):
         """Format a list of items as a string for display.
 
-        :param items: items to be displayed.
+        :param items: items to be displayed (any iterable).
         :param mode: the way to display them. Defaults to :py:func:`rows`. See :py:mod:`listdisplay`.
         :param \*args: optional args to ``mode``. See :py:mod:`listdisplay`.
         :rtype: formatted string
 """
+        items = [self.effectize_string(str(i)) for i in items]
         if not items: return ''
         mode = mode or rows
-        items = map(str, items)
-        items = map(self.effectize_string, items)
         s = mode(self, items, *args)
         return s
 
@@ -327,16 +587,42 @@ Context manager: on entry, output will no longer be colorized. ::
         size = len(lines)
         page_at = self.page_at
         while size > page_at:
-            self.out.write('\n'.join(lines[:page_at]))
+            self._write('\n'.join(lines[:page_at]) + '\n')
             lines = lines[page_at:]
             size -= page_at
-            self.out.write('\n')
-            c = self.y_or_n_style_q("-- press enter/return to continue or q to stop -- ", 'Qq\n')
-            self.out.write('\n')
-            if c in 'Qq':
+            if not self._continue_paging():
                 return ["...\n"]+lines[-2:]            
         return lines
 
+    def page_file(self, f):
+        """Page interactively through a file, which may be far larger than memory.
+
+        :param f: filename or file object.
+
+        See :py:class:`pager.Pager` for the commands available.
+"""
+        if self.feed is not None: # unattended: just write it out
+            if isinstance(f, basestring):
+                with open(f, 'rb') as f:
+                    return self.say_file(f)
+            return self.say_file(f)
+        from . import pager
+        with self._hold_output():
+            pager.Pager(self, f).run()
+
+    def _continue_paging(self):
+        if self.feed is not None:
+            return True # unattended: nobody to page for
+        # the answer isn't stripped, so that enter selects '\n' rather
+        # than being an ambiguous empty answer
+        ans = answers.Choice('Qq\n')
+        q = question.Question("-- press enter/return to continue or q to stop -- ",
+                              ans, character=True, whitespace=question.identity,
+                              ask_on_error=question.repeat_question)
+        c = self.ask(question=q, answer=ans)
+        self.out.write('\n')
+        return c not in 'Qq'
+
     def do_gather(self, q):
         g = q.gather
         q.gather = False
@@ -29,6 +29,7 @@ class Question(object):
                  case=preserve, confirm=None, gather=False, first_answer=None,
                  responses=None, overwrite=False, ask_on_error="? "):
         self.prompt = prompt
+        self.base_prompt = prompt # without the default appended
         if not answer or answer is str:
             answer = Answer()
         elif isinstance(answer, (tuple, list)):
@@ -53,6 +54,7 @@ class Question(object):
         self.case = case
         self.confirm = confirm
         self.gather = gather
+        self.gather_key = None # the key being asked for by gather=[keys]
         self.first_answer = first_answer
         self.responses = question_error_dispatch
         self.responses.update(responses or {})
@@ -66,7 +68,8 @@ class Question(object):
         pyline.say(str(self))
 
     def winnow(self, candidates, answergiven):
-        t = Trie(candidates)
+        # candidates may be an index already built by the answer
+        t = candidates if isinstance(candidates, Trie) else Trie(candidates)
         try:
             return t.get_by_prefix(answergiven)
         except NotAPrefix:
@@ -75,14 +78,18 @@ class Question(object):
             raise AmbiguousAutoCompleteMatch, t.get_all_by_prefix(answergiven)
 
     def convert(self, ans):
-        cands = self.answer.get_candidates()
-        if cands == None:
+        index = self.answer.get_index()
+        if index is None:
             return self.answer.convert(ans, ans)
-            self.answer.convert(ans, ans)
         else:
-            choice = self.winnow(cands, ans)
+            choice = self.winnow(index, ans)
             return self.answer.convert(choice, ans)
-            self.answer.convert(choice, ans)
+
+    def navigate(self, ans):
+        """``True`` if ``ans`` moved the question's display (e.g. scrolled
+        a menu) rather than answering it; the question is then shown
+        again."""
+        return False
 
     def answer_or_default(self, ans):
         ans = self.case(self.whitespace(ans))
@@ -0,0 +1,101 @@
+"""Serve PyLine sessions over TCP or UNIX sockets, telnet style.
+
+Each connection gets its own :py:class:`PyLine`, reading from and writing
+to the socket, and a thread in which ``session(pyline)`` is called to
+carry out the conversation, e.g. ::
+
+    def session(p):
+        p.shell(make_menu()) # a fresh Menu for every connection
+
+    PyLineServer(('127.0.0.1', 8023), session).serve_forever()
+
+The first line a client sends sets up its session: space-separated
+``cols=N``, ``rows=N`` and ``colors=0`` or ``colors=1``, any of which may
+be left out to take the defaults (80 columns, 24 rows, colors on).  A
+blank line takes all the defaults.  The client echoes what it sends
+itself, as telnet does.
+
+Sessions waiting for input cost a blocked thread each; the threads are
+given small stacks (``stack_size``), so hundreds of idle sessions take
+little memory.
+"""
+import socket, threading, SocketServer
+from .pyline import PyLine
+
+defaults = {'cols': 80, 'rows': 24, 'colors': 1}
+
+def parse_hello(line):
+    """Session settings from a client's first line, as a dict with the
+    keys of :py:data:`defaults`; unrecognised settings are ignored."""
+    settings = dict(defaults)
+    for word in line.split():
+        key, sep, value = word.partition('=')
+        if key in settings and value.isdigit():
+            settings[key] = int(value)
+    return settings
+
+class _Stream(object):
+    """A socket file, with the ``isatty()`` a PyLine expects."""
+    def __init__(self, f):
+        self.f = f
+    def isatty(self):
+        return False
+    def __getattr__(self, k):
+        return getattr(self.f, k)
+
+class SessionHandler(SocketServer.StreamRequestHandler):
+    """Runs the server's ``session`` over one connection."""
+    wbufsize = -1 # PyLine flushes when it waits for input
+
+    def setup(self):
+        # a prompt shouldn't wait for the ACK of the text before it
+        self.disable_nagle_algorithm = self.server.address_family in \
+            (socket.AF_INET, getattr(socket, 'AF_INET6', None))
+        SocketServer.StreamRequestHandler.setup(self)
+
+    def make_pyline(self, settings):
+        return PyLine(inp=_Stream(self.rfile), out=_Stream(self.wfile),
+                      colors=bool(settings['colors']),
+                      size=(settings['cols'], settings['rows']),
+                      **self.server.pyline_args)
+
+    def handle(self):
+        hello = self.rfile.readline(1024)
+        if not hello:
+            return
+        self.pyline = self.make_pyline(parse_hello(hello))
+        try:
+            self.server.session(self.pyline)
+        except (EOFError, socket.error):
+            pass # the client went away
+
+class _SessionServer(SocketServer.ThreadingMixIn):
+    daemon_threads = True
+    request_queue_size = 128 # operators may all connect at once
+    stack_size = 256 * 1024
+
+    def __init__(self, address, session, handler=SessionHandler, **pyline_args):
+        self.session = session
+        self.pyline_args = pyline_args
+        self.server_class.__init__(self, address, handler)
+
+    def process_request(self, request, client_address):
+        # threads take the stack size in force when they're started
+        old = threading.stack_size(self.stack_size)
+        try:
+            SocketServer.ThreadingMixIn.process_request(self, request,
+                                                        client_address)
+        finally:
+            threading.stack_size(old)
+
+class PyLineServer(_SessionServer, SocketServer.TCPServer):
+    """Serves ``session(pyline)`` to each client connecting to the TCP
+    ``address``; ``pyline_args`` are passed to each :py:class:`PyLine`.
+"""
+    server_class = SocketServer.TCPServer
+    allow_reuse_address = True
+
+if hasattr(socket, 'AF_UNIX'):
+    class UnixPyLineServer(_SessionServer, SocketServer.UnixStreamServer):
+        """Like :py:class:`PyLineServer`, on the UNIX socket ``address``."""
+        server_class = SocketServer.UnixStreamServer
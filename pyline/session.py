@@ -0,0 +1,147 @@
+"""Run PyLine conversations without blocking the caller.
+
+A :py:class:`PyLineSession` runs a function that talks to the user through
+a :py:class:`PyLine` in a thread of its own.  The PyLine reads from an
+:py:class:`InputChannel` and writes to an :py:class:`OutputChannel`, so
+whatever drives the session (an event loop serving many connections, a
+GUI, a test) hands it input with :py:meth:`PyLineSession.feed` and
+collects its output with :py:meth:`PyLineSession.drain`, neither of which
+ever waits for the conversation.  Questions, answers and menus are used
+exactly as with a PyLine on a terminal.
+"""
+import threading
+from .pyline import PyLine
+
+class InputChannel(object):
+    """File-like object to be a PyLine's ``inp``.  Reads wait until enough
+    input has been given to :py:meth:`feed`, or the channel is closed.
+"""
+    def __init__(self):
+        self.buf = ''
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def feed(self, data):
+        with self.cond:
+            self.buf += data
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def _take(self, end):
+        data, self.buf = self.buf[:end], self.buf[end:]
+        return data
+
+    def read(self, n=-1):
+        with self.cond:
+            while not self.closed and (n < 0 or len(self.buf) < n):
+                if n > 0 and self.buf:
+                    break # a short read, as from a pipe
+                self.cond.wait()
+            return self._take(len(self.buf) if n < 0 else n)
+
+    def readline(self, size=-1):
+        with self.cond:
+            while not self.closed and '\n' not in self.buf and \
+                  (size < 0 or len(self.buf) < size):
+                self.cond.wait()
+            end = self.buf.find('\n') + 1 or len(self.buf)
+            if size >= 0:
+                end = min(end, size)
+            return self._take(end)
+
+    def isatty(self):
+        return False
+
+class OutputChannel(object):
+    """File-like object to be a PyLine's ``out``.  What is written is kept
+    until :py:meth:`drain` is called; ``notify``, if given, is called (in
+    the writing thread) whenever output is flushed.
+"""
+    def __init__(self, notify=None):
+        self.chunks = []
+        self.lock = threading.Lock()
+        self.notify = notify
+
+    def write(self, s):
+        with self.lock:
+            self.chunks.append(s)
+
+    def flush(self):
+        if self.notify is not None:
+            self.notify()
+
+    def drain(self):
+        """Everything written since the last call."""
+        with self.lock:
+            out = ''.join(self.chunks)
+            del self.chunks[:]
+        return out
+
+    def isatty(self):
+        return False
+
+class PyLineSession(object):
+    """Runs ``target(pyline)`` in a daemon thread, where ``pyline`` is a
+    :py:class:`PyLine` over an :py:class:`InputChannel` and an
+    :py:class:`OutputChannel`.
+
+    :param target: function carrying out the conversation.
+    :param notify: called, in the session's thread, whenever there is new
+        output and when the session ends; e.g. a function that wakes the
+        event loop driving the session.
+    :param k: keyword args passed to the :py:class:`PyLine` constructor.
+
+    When the session ends, ``result`` holds what ``target`` returned, or
+    ``error`` the exception it raised (:py:exc:`EOFError` if the input was
+    closed before the conversation ended).
+"""
+    def __init__(self, target, notify=None, **k):
+        self.target = target
+        self.notify = notify
+        self.inp = InputChannel()
+        self.out = OutputChannel(notify)
+        self.pyline = PyLine(inp=self.inp, out=self.out, **k)
+        self.result = self.error = None
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="pyline-session")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.target(self.pyline)
+        except BaseException, e:
+            self.error = e
+        finally:
+            self.finished.set()
+            if self.notify is not None:
+                self.notify()
+
+    def feed(self, data):
+        """Give the session input, as if typed."""
+        self.inp.feed(data)
+
+    def drain(self):
+        """Output written by the session since the last call."""
+        return self.out.drain()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        """Wait up to ``timeout`` seconds for the session to end; return
+        ``True`` if it has."""
+        self.finished.wait(timeout)
+        return self.finished.is_set()
+
+    def close(self):
+        """End the session's input: a question waiting for an answer will
+        raise :py:exc:`EOFError`."""
+        self.inp.close()
@@ -1,54 +1,241 @@
-import sys
+"""Terminal handling.
+
+Nothing beyond :py:mod:`os`, :py:mod:`sys`, :py:mod:`errno` and
+:py:mod:`signal` is imported until it's needed: :py:mod:`termios` when a
+terminal is first read from, :py:mod:`curses` and :py:mod:`subprocess`
+only if the terminal's size or mode can't be had any other way.
+"""
+import re, os, sys, errno, signal
+
+__all__ = ['get_character', 'CharReader', 'input_session', 'terminal_size']
 
 def get_character(inp=sys.stdin):
-    if not inp.isatty():
-        return inp.read(1)
-    return _get_character(inp)
+    if inp.isatty():
+        session = _session_class()
+        if session is not None:
+            with session(inp):
+                return inp.read(1)
+    return inp.read(1)
+
+_controls = re.compile('[\r\n\b\x7f]')
+
+class CharReader(object):
+    """Reads ``inp`` a character or a run of characters at a time,
+    starting with any ``pending`` characters read ahead by an earlier
+    session.  Input is read a line at a time, but no more of it than the
+    caller needs (so a read never waits for more input than that), so a
+    pipe or file costs one read per line, not per byte.  As a context manager it does nothing;
+    see :py:func:`input_session`.
+"""
+    def __init__(self, inp, pending=''):
+        self.inp = inp
+        self.buf = pending
+        self.pos = 0
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        pass
+    def _fill(self, size):
+        self.buf = self.inp.readline(size)
+        self.pos = 0
+        return self.buf
+    def read(self):
+        if self.pos >= len(self.buf) and not self._fill(1):
+            return ''
+        self.pos += 1
+        return self.buf[self.pos-1]
+    def read_run(self, limit=None):
+        """Up to ``limit`` characters, stopping before the next newline,
+        carriage return or backspace; ``''`` if that comes next or the
+        input is exhausted."""
+        if self.pos >= len(self.buf) and not self._fill(limit or 4096):
+            return ''
+        m = _controls.search(self.buf, self.pos)
+        end = m.start() if m else len(self.buf)
+        if limit is not None:
+            end = min(end, self.pos + limit)
+        run = self.buf[self.pos:end]
+        self.pos = end
+        return run
+    def waiting(self):
+        """True if more input has already been read."""
+        return self.pos < len(self.buf)
+    def unread(self):
+        """Input that has been read but not consumed."""
+        return self.buf[self.pos:]
+
+def input_session(inp, pending=''):
+    """A session that puts the terminal ``inp`` into raw mode for as long
+    as it is in use as a context manager, if we know how to; otherwise a
+    :py:class:`CharReader`."""
+    if inp.isatty():
+        session = _session_class()
+        if session is not None:
+            return session(inp, pending)
+    return CharReader(inp, pending)
+
+_session_class = lambda: None
+_query_size = lambda f=None: None
 
 if sys.platform == 'win32':
     pass
 elif sys.platform in ('riscos', 'os2', 'os2emx', 'atheos'):
     pass
 else:
-    import termios
-    try:
-        import curses
-        def _get_character(inp=sys.stdin):
-            old = termios.tcgetattr(inp)
-            new = old[:]
-            new[-1] = old[-1][:]
+    def _termios():
+        try:
+            import termios
+        except ImportError:
+            return None
+        return termios
+
+    def _stty(inp, *args):
+        from subprocess import Popen, PIPE
+        return Popen(("stty",) + args, stdin=inp,
+                     stdout=PIPE).communicate()[0].rstrip()
+
+    def _have_stty():
+        from subprocess import Popen, PIPE
+        try:
+            Popen(["stty"], stdout=PIPE, stderr=PIPE).communicate()
+        except OSError, e:
+            if e.errno != 2: raise
+            sys.stderr.write("To use PyLine, you need either the termios module or the stty program.\n")
+            return False
+        return True
+
+    class _FdSession(CharReader):
+        def _fill(self, size):
+            # whatever has been typed, however much that is
+            while True:
+                try:
+                    self.buf = os.read(self.fd, 4096)
+                    break
+                except OSError, e:
+                    # a signal arrived first (say, the terminal was resized)
+                    if e.errno != errno.EINTR: raise
+            self.pos = 0
+            return self.buf
+
+    class _TermiosSession(_FdSession):
+        """Context manager that turns off echo and line buffering on the
+        terminal ``inp`` on entry and restores them on exit, so a whole
+        question costs two mode switches rather than two per keystroke.
+        Input is read straight from the file descriptor, as much as is
+        available at once, so pasted text is read in one go.
+"""
+        def __enter__(self):
+            termios = _termios()
+            self.fd = self.inp.fileno()
+            self.old = termios.tcgetattr(self.fd)
+            new = self.old[:]
+            new[-1] = self.old[-1][:]
             new[3] &= ~(termios.ECHO | termios.ICANON)
             new[-1][termios.VMIN] = 1
-            try:
-                termios.tcsetattr(inp, termios.TCSANOW, new)
-                return inp.read(1)
-            finally:
-                termios.tcsetattr(inp, termios.TCSANOW, old)
+            new[-1][termios.VTIME] = 0
+            termios.tcsetattr(self.fd, termios.TCSANOW, new)
+            return self
+        def __exit__(self, *exc):
+            termios = _termios()
+            termios.tcsetattr(self.fd, termios.TCSANOW, self.old)
+
+    class _SttySession(_FdSession):
+        """Like :py:class:`_TermiosSession`, but the terminal mode is
+        changed by running ``stty``: once on entry and once on exit,
+        rather than three times per keystroke."""
+        raw = ("-echo", "-icanon", "min", "1", "time", "0")
+        def __enter__(self):
+            self.fd = self.inp.fileno()
+            self.old = _stty(self.inp, "-g")
+            _stty(self.inp, *self.raw)
+            return self
+        def __exit__(self, *exc):
+            _stty(self.inp, self.old)
 
-        def terminal_size():
+    _sessions = []
+    def _session_class():
+        # chosen when a terminal is first read from
+        if not _sessions:
+            if _termios() is not None:
+                _sessions.append(_TermiosSession)
+            elif _have_stty():
+                _sessions.append(_SttySession)
+            else:
+                _sessions.append(None)
+        return _sessions[0]
+
+    def _query_size(f=None):
+        # (columns, rows) of the terminal f, or of whichever of stdout,
+        # stdin or stderr is one, or None
+        termios = _termios()
+        try:
+            import fcntl, struct
+        except ImportError:
+            fcntl = None
+        if termios is not None and fcntl is not None:
+            for f in ((f,) if f else (sys.stdout, sys.stdin, sys.stderr)):
+                try:
+                    size = fcntl.ioctl(f.fileno(), termios.TIOCGWINSZ, '\0' * 8)
+                except (IOError, ValueError, AttributeError):
+                    continue
+                rows, cols = struct.unpack('hhhh', size)[:2]
+                if rows and cols:
+                    return (cols, rows)
+        try:
+            import curses
+        except ImportError:
+            curses = None
+        if curses is not None:
             try:
                 win = curses.initscr()
-                return reversed(win.getmaxyx())
+                return tuple(reversed(win.getmaxyx()))
             finally:
                 curses.endwin()
-            return (80, 40)
-    except ImportError:
-        import re
-        from subprocess import Popen, PIPE
-        output = lambda a: Popen(a, stdout=PIPE).communicate()[0].rstrip()
-        try:
-            output(["stty"])
-        except OSError, e:
-            if e.errno != 2: raise
-            sys.stderr.write("To use PyLine, you need either the curses module or the stty program.\n")
+        if termios is None:
+            rows, cols = map(int, _stty(f or sys.stdin, "size").split())
+            return (cols, rows)
+        return None
+
+_sizes = {} # fd (or None) -> (columns, rows)
+_watching = False
+_previous_winch = None
 
-        def _get_character(inp=sys.stdin):
-            state = output(["stty","-g"])
+def _on_winch(signum, frame):
+    _sizes.clear()
+    if hasattr(_previous_winch, '__call__'):
+        _previous_winch(signum, frame)
+
+def _watch_winch():
+    # the size cache is only trustworthy once we hear about resizes,
+    # and handlers can only be installed from the main thread
+    global _watching, _previous_winch
+    if not _watching:
+        if not hasattr(signal, 'SIGWINCH'):
+            _watching = True
+        else:
             try:
-                output("stty raw -echo -icanon isig".split())
-                return inp.read(1)
-            finally:
-                output(["stty",state])
+                _previous_winch = signal.signal(signal.SIGWINCH, _on_winch)
+                # Python makes a signal with a handler interrupt system
+                # calls; resizing shouldn't break a read in progress
+                signal.siginterrupt(signal.SIGWINCH, False)
+                _watching = True
+            except ValueError:
+                pass
+    return _watching
 
-        def terminal_size():
-            return tuple(map(int, output(["stty", "size"]).split()))
+def terminal_size(f=None):
+    """``(columns, rows)`` of the terminal ``f``, or by default of whichever
+    of stdout, stdin and stderr is one; ``(80, 24)`` if it can't be
+    found.  Sizes are cached for the whole process and forgotten when
+    the terminal is resized (``SIGWINCH``), so calling this is cheap.
+"""
+    try:
+        key = f.fileno() if f is not None else None
+    except (AttributeError, ValueError, IOError):
+        f = key = None
+    size = _sizes.get(key)
+    if size is None:
+        size = _query_size(f) or (80, 24)
+        if _watch_winch():
+            _sizes[key] = size
+    return size
@@ -1,6 +1,23 @@
-import re, contextlib, textwrap
+import re, os, time, glob, bisect, fnmatch, string, contextlib, thread
+from . import colors
 from .colors import e
 
+# os.scandir, or the scandir package's, or None.  Looked for on first use,
+# as the package takes longer to import than the rest of pyline together.
+_unresolved = object()
+scandir = _unresolved
+def _get_scandir():
+    global scandir
+    if scandir is _unresolved:
+        try:
+            from os import scandir
+        except ImportError:
+            try:
+                from scandir import scandir
+            except ImportError:
+                scandir = None
+    return scandir
+
 def remove_capture_whitespace(s):
     m = re.search("([ \t\n]+)$", s)
     if not m:
@@ -15,15 +32,190 @@ def insert_before_whitespace(s, insert):
     return s
 
 def effectize_string(s, vals=None, keys=None, scheme=None):
+    if '{' not in s and '}' not in s and '\033' not in s:
+        return s # nothing to format and no escapes to reset
     scheme = scheme or e
     keys = keys or {}
     vals = vals or ()
     s, ws = remove_capture_whitespace(s)
     if not s.endswith(e.clear.code):
-        s = s.format(scheme, __colors=scheme, *vals, **keys)+e.clear.code + ws
+        s = format_template(s, scheme, vals, keys)
+        if '\033' in s and not isinstance(scheme, colors.NullEffect):
+            s += e.clear.code
+        s += ws
     else: s += ws
     return s
 
+class GenerationCache(object):
+    """Bounded mapping that keeps roughly the ``size`` most recently used
+    entries.
+
+    New entries go into a young generation; when it fills up it becomes
+    the old generation and the previous old one is dropped.  Entries
+    found in the old generation are moved back into the young one.
+"""
+    def __init__(self, size):
+        self.size = size
+        self.clear()
+    def clear(self):
+        self.young = {}
+        self.old = {}
+    def get(self, key, default=None):
+        try:
+            return self.young[key]
+        except KeyError:
+            pass
+        try:
+            val = self.old.pop(key)
+        except KeyError:
+            return default
+        self[key] = val
+        return val
+    def __setitem__(self, key, val):
+        if len(self.young) >= self.size:
+            self.old = self.young
+            self.young = {}
+        self.young[key] = val
+
+_get_ident = thread.get_ident
+class ReentrantLock(object):
+    """A lock that the thread holding it may take again, like
+    :py:func:`threading.RLock`, but needing only the builtin
+    :py:mod:`thread` module, which is cheaper to import.
+"""
+    def __init__(self):
+        self._lock = thread.allocate_lock()
+        self._owner = None
+        self._count = 0
+    def mine(self):
+        """``True`` if the calling thread holds the lock."""
+        return self._owner == _get_ident()
+    def theirs(self):
+        """``True`` if another thread holds the lock."""
+        owner = self._owner
+        return owner is not None and owner != _get_ident()
+    def acquire(self, blocking=True):
+        me = _get_ident()
+        if self._owner != me:
+            if not self._lock.acquire(blocking):
+                return False
+            self._owner = me
+        self._count += 1
+        return True
+    def release(self):
+        self._count -= 1
+        if not self._count:
+            self._owner = None
+            self._lock.release()
+    def __enter__(self):
+        self.acquire()
+        return self
+    def __exit__(self, *exc):
+        self.release()
+
+def _escape_braces(s):
+    return s.replace('{', '{{').replace('}', '}}')
+
+def compile_template(s, scheme):
+    """Rewrite the format string ``s`` for use with ``scheme``.
+
+    Fields that refer to the scheme (``{0.red:...}`` or
+    ``{__colors.red:...}``) are looked up now, and when the effect just
+    wraps its text the field is replaced by the effect's escape codes
+    around its format spec.  The result is still a format string taking
+    the same arguments as ``s``.
+"""
+    out = []
+    for (literal, name, spec, conversion) in s._formatter_parser():
+        out.append(_escape_braces(literal))
+        if name is None:
+            continue
+        first, rest = name._formatter_field_name_split()
+        if first == '':
+            raise ValueError("automatic field numbering")
+        rest = list(rest)
+        if first in (0, '__colors') and conversion is None and \
+               all(is_attr for (is_attr, k) in rest):
+            effect = scheme
+            for (_, k) in rest:
+                effect = getattr(effect, k)
+            wrap = colors.affixes(effect)
+            if wrap:
+                out.append(_escape_braces(wrap[0]))
+                out.append(compile_template(spec, scheme))
+                out.append(_escape_braces(wrap[1]))
+                continue
+        out.append('{' + name)
+        if conversion:
+            out.append('!' + conversion)
+        if spec:
+            out.append(':' + spec)
+        out.append('}')
+    return ''.join(out)
+
+_templates = GenerationCache(512)
+
+def format_template(s, scheme, vals=(), keys=None):
+    """Equivalent to ``s.format(scheme, __colors=scheme, *vals, **keys)``,
+    but ``s`` is compiled with :py:func:`compile_template` once per
+    string and scheme (and again if the scheme's colormap changes)."""
+    if '{' not in s and '}' not in s:
+        return s
+    key = (s, scheme, scheme.generation)
+    compiled = _templates.get(key)
+    if compiled is None:
+        try:
+            compiled = compile_template(s, scheme)
+        except (ValueError, AttributeError):
+            # let str.format raise (or handle whatever we don't)
+            compiled = s
+        else:
+            if '{' not in compiled and '}' not in compiled:
+                compiled = (compiled,) # nothing left to fill in
+            _templates[key] = compiled
+    if isinstance(compiled, tuple):
+        return compiled[0]
+    return compiled.format(scheme, __colors=scheme, *vals, **(keys or {}))
+
+_merged = GenerationCache(512)
+
+def effectize_merged(s, scheme=None, vals=(), keys=None):
+    """Like :py:func:`effectize_string` followed by
+    :py:func:`colors.optimize_sgr`, returning ``(text, bytes saved)``.
+    The escape codes of ``s`` are merged once, when it is compiled; only
+    if the values filled in bring escape codes of their own is the
+    result merged again each time."""
+    scheme = scheme or e
+    body, ws = remove_capture_whitespace(s)
+    merged = None
+    if not body.endswith(e.clear.code):
+        key = (body, scheme, scheme.generation)
+        merged = _merged.get(key)
+        if merged is None:
+            try:
+                compiled = compile_template(body, scheme)
+            except (ValueError, AttributeError):
+                pass # see format_template
+            else:
+                if '\033' in compiled:
+                    compiled += e.clear.code
+                template = colors.optimize_sgr(compiled)
+                merged = _merged[key] = (
+                    template, template.count('\033'),
+                    len(compiled) - len(template),
+                    '{' in template or '}' in template)
+    if merged is not None:
+        template, escapes, saved, fields = merged
+        if not fields:
+            return (template + ws, saved)
+        text = template.format(scheme, __colors=scheme, *vals, **(keys or {}))
+        if text.count('\033') == escapes:
+            return (text + ws, saved)
+    # values with escape codes of their own: merge what's been made of them
+    text = effectize_string(s, vals, keys, scheme)
+    merged = colors.optimize_sgr(text)
+    return (merged, len(text) - len(merged))
+
 unset = object()
 
 def reassigning(obj, name, newobj):
@@ -43,9 +235,134 @@ def reassignings(obj, names, newobjs):
                 setattr(obj, name, old)
 
 _escape_pat = re.compile('\033[^m]+?m')
+_escape_split = re.compile('(\033[^m]+?m)')
 def real_len(s):
     return len(_escape_pat.sub('', s))
-textwrap.len = real_len #what base trickery!
+
+# the same chunking rules as textwrap's defaults
+_wordsep_re = re.compile(
+    r'(\s+|'                                  # any whitespace
+    r'[^\s\w]*\w+[^0-9\W]-(?=\w+[^0-9\W])|'   # hyphenated words
+    r'(?<=[\w\!\"\'\&\.\,\?])-{2,}(?=\w))')   # em-dash
+_whitespace = '\t\n\x0b\x0c\r '
+_whitespace_trans = string.maketrans(_whitespace, ' ' * len(_whitespace))
+_whitespace_re = re.compile('[%s]' % _whitespace)
+
+def _wrap_spans(text, width):
+    # textwrap's algorithm, but producing (start, end) offsets into text
+    spans = []
+    start = end = before = None
+    cur_len = 0
+    last_space = False
+    pos = 0
+    for chunk in _wordsep_re.split(text):
+        off = pos
+        n = len(chunk)
+        pos += n
+        while n:
+            space = text[off] == ' '
+            if space and start is None and spans:
+                break # whitespace at the start of all but the first line
+            if cur_len + n <= width:
+                if start is None:
+                    start = before = off
+                else:
+                    before = end
+                end = off + n
+                cur_len += n
+                last_space = space
+                break
+            if n > width: # long word: fill the rest of this line with it
+                k = width - cur_len
+                if start is None:
+                    start = before = off
+                else:
+                    before = end
+                end = off + k
+                last_space = space or not k
+                off += k
+                n -= k
+            if start is not None:
+                stop = before if last_space else end
+                if stop > start:
+                    spans.append((start, stop))
+            start = end = before = None
+            cur_len = 0
+    if start is not None:
+        stop = before if last_space else end
+        if stop > start:
+            spans.append((start, stop))
+    return spans
+
+def wrap(text, width):
+    """Wrap a single line of text to ``width`` columns, returning a list of lines.
+
+    Lines are broken in the same places as by :py:func:`textwrap.wrap`
+    with its default options, except that escape sequences take up no
+    columns: the plain text is wrapped and each line is then sliced out
+    of the original, escapes and all.  An escape sequence that
+    falls in whitespace dropped at a line break starts the next line.
+"""
+    if width <= 0:
+        raise ValueError("invalid width %r (must be > 0)" % width)
+    text = text.expandtabs()
+    if isinstance(text, str):
+        text = text.translate(_whitespace_trans)
+    else:
+        text = _whitespace_re.sub(u' ', text)
+    if '\033' not in text:
+        return [text[a:b] for (a, b) in _wrap_spans(text, width)]
+    pieces = _escape_split.split(text)
+    plain = ''.join(pieces[::2])
+    seqs = pieces[1::2]
+    # offs[i]: offset in plain of seqs[i]; cum[i]: length of seqs[:i]
+    offs = []
+    cum = [0]
+    p = c = 0
+    for (t, seq) in zip(pieces[::2], seqs):
+        p += len(t)
+        c += len(seq)
+        offs.append(p)
+        cum.append(c)
+    lines = []
+    prev = -1
+    for (a, b) in _wrap_spans(plain, width):
+        # sequences after the previous line's text and before this
+        # line's (i.e. in dropped whitespace) start this line
+        lo = bisect.bisect_right(offs, prev)
+        hi = bisect.bisect_left(offs, a)
+        start = a + cum[max(lo, hi)]
+        end = b + cum[bisect.bisect_right(offs, b)]
+        lines.append(''.join(seqs[lo:hi]) + text[start:end])
+        prev = b
+    rest = ''.join(seqs[bisect.bisect_right(offs, prev):])
+    if rest:
+        if lines:
+            lines[-1] += rest
+        else:
+            lines.append(rest)
+    return lines
+
+def iter_lines(chunks):
+    """Yield the lines of the text arriving in ``chunks`` (an iterable of
+    strings, split anywhere), without their newlines.  Only the current
+    line is ever held in memory."""
+    pending = []
+    for chunk in chunks:
+        if '\n' not in chunk:
+            if chunk:
+                pending.append(chunk)
+            continue
+        lines = chunk.split('\n')
+        if pending:
+            pending.append(lines[0])
+            lines[0] = ''.join(pending)
+        last = lines.pop()
+        pending = [last] if last else []
+        for line in lines:
+            yield line
+    if pending:
+        yield ''.join(pending)
 
 def get_by_class(obj, dispatch):
     for k in obj.__class__.__mro__:
@@ -53,67 +370,213 @@ def get_by_class(obj, dispatch):
             return dispatch[k]
     return None
 
+class DirectoryListing(object):
+    """Names in one directory, as of the directory's mtime.
+
+    Uses ``scandir`` (from :py:mod:`os` or the ``scandir`` package) when
+    available so that :py:meth:`isfile` can use the type information
+    returned by the directory read rather than stat-ing every entry.
+    Glob results are remembered per pattern.
+"""
+    def __init__(self, path):
+        self.path = path
+        self.scanned_at = time.time()
+        self._globs = {}
+        self._files = {}
+        self._isfile = {}
+        try:
+            self.mtime = os.stat(path).st_mtime
+            scan = _get_scandir()
+            if scan:
+                entries = list(scan(path))
+                self._entries = dict((d.name, d) for d in entries)
+                self.names = [d.name for d in entries]
+            else:
+                self._entries = None
+                self.names = os.listdir(path)
+        except OSError:
+            self.mtime = None
+            self._entries = None
+            self.names = []
+
+    def current(self):
+        """``True`` if the directory hasn't changed since it was read.
+
+        A listing taken within a second of the directory being modified
+        is never trusted, since the change may not have moved the mtime
+        on filesystems with coarse timestamps.
+"""
+        if self.mtime is None or self.scanned_at - self.mtime < 1:
+            return False
+        try:
+            return os.stat(self.path).st_mtime == self.mtime
+        except OSError:
+            return False
+
+    def isfile(self, name):
+        if name not in self._isfile:
+            if self._entries is not None and name in self._entries:
+                try:
+                    self._isfile[name] = self._entries[name].is_file()
+                except OSError:
+                    self._isfile[name] = False
+            else:
+                self._isfile[name] = os.path.isfile(os.path.join(self.path,
+                                                                 name))
+        return self._isfile[name]
+
+    def glob(self, pattern):
+        """Names matching ``pattern``, following :py:func:`glob.glob`'s rules."""
+        if pattern not in self._globs:
+            if os.sep in pattern or (os.altsep and os.altsep in pattern):
+                names = [os.path.basename(f) for f in
+                         glob.glob(os.path.join(self.path, pattern))]
+            elif not glob.has_magic(pattern):
+                names = [pattern] if os.path.lexists(
+                    os.path.join(self.path, pattern)) else []
+            else:
+                names = self.names
+                if pattern[:1] != '.':
+                    names = [n for n in names if n[:1] != '.']
+                names = fnmatch.filter(names, pattern)
+            self._globs[pattern] = names
+        return self._globs[pattern]
+
+    def files(self, pattern):
+        """Names matching ``pattern`` that are regular files."""
+        if pattern not in self._files:
+            self._files[pattern] = [n for n in self.glob(pattern)
+                                    if self.isfile(n)]
+        return self._files[pattern]
+
+_listings = {}
+_max_listings = 64
+def list_directory(path):
+    """Return a :py:class:`DirectoryListing` for ``path``, reading the
+    directory again only if it has changed since the last call.
+"""
+    listing = _listings.get(path)
+    if listing is None or not listing.current():
+        listing = DirectoryListing(path)
+        if len(_listings) >= _max_listings:
+            _listings.clear()
+        _listings[path] = listing
+    return listing
+
 class NotAPrefix(Exception):
     pass
 class NotAUniquePrefix(Exception):
     pass
 
-class Trie:
-    def __init__(self, items):
-        self.out = {}
-        self.hasbranches = False
+class _TrieNode(object):
+    __slots__ = ('label', 'children', 'isterm', 'val', 'count')
+    def __init__(self, label):
+        self.label = label
+        self.children = None # first character of child's label -> child
         self.isterm = False
+        self.val = None
+        self.count = 0 # number of words ending at or below this node
+
+class Trie(object):
+    """Path-compressed prefix tree mapping ``str(item)`` to ``item``.
+
+    Each node holds a run of characters rather than a single one, and
+    leaves don't get a children dict, so memory is roughly proportional
+    to the number of words rather than the number of characters.  All
+    traversals are iterative.
+"""
+    __slots__ = ('root',)
+    def __init__(self, items):
+        self.root = _TrieNode('')
         for i in items:
             self.insert(str(i), i)
+    def _find(self, word):
+        # returns (node, text of the path to node) for the node at or
+        # below which all words beginning with word are found.
+        node = self.root
+        i = 0
+        n = len(word)
+        while i < n:
+            child = node.children and node.children.get(word[i])
+            if not child:
+                raise NotAPrefix
+            label = child.label
+            if word.startswith(label, i):
+                i += len(label)
+                node = child
+            elif label.startswith(word[i:]):
+                return child, word[:i] + label
+            else:
+                raise NotAPrefix
+        return node, word
     def __contains__(self, word):
-        trie = self
-        for c in word:
-            if c not in trie.out: return False
-            trie = trie.out[c]
-        return trie.isterm
-    def insert(self, word, val):
-        if word in self: return
-        if self.out: self.hasbranches = True 
-        trie = self
+        try:
+            node, path = self._find(word)
+        except NotAPrefix:
+            return False
+        return node.isterm and path == word
+    def insert(self, word, val, replace=False):
+        node = self.root
+        path = [node]
         i = 0
-        while i < len(word) and word[i] in trie.out:
-            trie = trie.out[word[i]]
-            trie.hasbranches = True
-            i += 1
-        if i == len(word):
-            trie.isterm = True
+        n = len(word)
+        while i < n:
+            child = node.children and node.children.get(word[i])
+            if not child:
+                child = _TrieNode(word[i:])
+                if node.children is None:
+                    node.children = {}
+                node.children[word[i]] = child
+                node = child
+                path.append(node)
+                break
+            label = child.label
+            if word.startswith(label, i):
+                i += len(label)
+                node = child
+                path.append(node)
+                continue
+            j = 1
+            m = min(len(label), n - i)
+            while j < m and word[i+j] == label[j]:
+                j += 1
+            mid = _TrieNode(label[:j])
+            mid.children = {label[j]: child}
+            mid.count = child.count
+            child.label = label[j:]
+            node.children[word[i]] = mid
+            node = mid
+            path.append(node)
+            i += j
+        if node.isterm:
+            if replace:
+                node.val = val
             return
-        trie.out[word[i]] = Trie([word[i+1:]])
-        while i < len(word):
-            trie = trie.out[word[i]]
-            i += 1
-        trie.isterm = True
-        trie.val = val
+        node.isterm = True
+        node.val = val
+        for p in path:
+            p.count += 1
     def get_by_prefix(self, word):
-        trie = self
-        for c in word:
-            if c not in trie.out:
-                raise NotAPrefix
-            trie = trie.out[c]
-        if trie.hasbranches:
+        node, _ = self._find(word)
+        if node.count > 1:
             raise NotAUniquePrefix
-        while trie.out:
-            for c in trie.out:
-                trie = trie.out[c]
-        return trie.val
+        if not node.count:
+            raise NotAPrefix
+        while not node.isterm:
+            for node in node.children.itervalues():
+                if node.count: break
+        return node.val
     def get_all_by_prefix(self, word):
-        trie = self
-        w = []
-        for c in word:
-            if c not in trie.out:
-                raise NotAPrefix
-            w.append(c)
-            trie = trie.out[c]
-        w = ''.join(w)
-        for rest in trie:
-            yield w+rest
+        node, path = self._find(word)
+        return self._walk(node, path)
+    def _walk(self, node, path):
+        stack = [(node, path)]
+        while stack:
+            node, path = stack.pop()
+            if node.isterm:
+                yield path
+            if node.children:
+                stack.extend((c, path + c.label)
+                             for c in reversed(node.children.values()))
     def __iter__(self):
-        if self.isterm: yield ''
-        for c in self.out:
-            for rest in self.out[c]:
-                yield c+rest
+        return self._walk(self.root, '')
@@ -0,0 +1,66 @@
+"""Write a PyLine's output from a thread of its own.
+
+See :py:meth:`PyLine.background_output`.
+"""
+import threading, Queue
+
+class BackgroundWriter(object):
+    """Writes the text given to :py:meth:`put` to ``pyline.out``, in order,
+    holding ``pyline.output_lock`` for each write (or, while a question is
+    being asked, handing it to the PyLine to write once it's answered).
+    Whatever has queued up while the previous write was in progress is
+    written at once.  At most ``maxsize`` texts wait to be written;
+    beyond that, :py:meth:`put` waits.
+"""
+    def __init__(self, pyline, maxsize=1024):
+        self.pyline = pyline
+        self.queue = Queue.Queue(maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="pyline-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, text):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(text)
+
+    def flush(self):
+        """Wait until everything put so far has been written."""
+        written = threading.Event()
+        self.put(written)
+        written.wait()
+
+    def stop(self):
+        """Write everything put so far, then end the thread."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _write(self, texts):
+        if texts and self.error is None:
+            try:
+                self.pyline._emit(''.join(texts))
+            except Exception, e:
+                self.error = e # raised in the threads using the writer
+        del texts[:]
+
+    def _run(self):
+        texts = []
+        while True:
+            item = self.queue.get()
+            while True:
+                if item is None:
+                    self._write(texts)
+                    return
+                elif isinstance(item, basestring):
+                    texts.append(item)
+                else: # flush()
+                    self._write(texts)
+                    item.set()
+                try:
+                    item = self.queue.get_nowait()
+                except Queue.Empty:
+                    break
+            self._write(texts)
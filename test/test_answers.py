@@ -3,6 +3,7 @@ import pytest
 import pyline.pyline
 import pyline.question
 import pyline.answers
+import pyline.utils
 from conftest import *
 
 def test_pathname_answer(tmpdir):
@@ -83,3 +84,25 @@ def test_callable_answer():
     with pytest.raises(EOFError):
         res = p.ask(q)
     assert no_clear(out.getvalue()) == 'Your name? Answer could not be processed: Invalid name format.\n? '
+
+@pytest.mark.parametrize("use_scandir", [True, False])
+def test_directory_listing_cache(tmpdir, monkeypatch, use_scandir):
+    if not use_scandir:
+        monkeypatch.setattr(pyline.utils, 'scandir', None)
+    tmpdir.join('a.txt').ensure()
+    tmpdir.join('.hidden').ensure()
+    tmpdir.mkdir('b.txt')
+    past = os.stat(tmpdir.strpath).st_mtime - 10
+    os.utime(tmpdir.strpath, (past, past))
+    listing = pyline.utils.list_directory(tmpdir.strpath)
+    assert pyline.utils.list_directory(tmpdir.strpath) is listing
+    a = pyline.answers.File(directory=tmpdir.strpath, glob='*.txt')
+    assert a.get_candidates() == ['a.txt']
+    assert a.get_index() is a.get_index()
+    assert sorted(pyline.answers.Pathname(tmpdir.strpath).get_candidates()) == \
+           ['a.txt', 'b.txt']
+    tmpdir.join('c.txt').ensure()
+    os.utime(tmpdir.strpath, (past + 5, past + 5))
+    assert pyline.utils.list_directory(tmpdir.strpath) is not listing
+    assert sorted(a.get_candidates()) == ['a.txt', 'c.txt']
+    assert 'c.txt' in a.get_index()
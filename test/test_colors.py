@@ -1,4 +1,6 @@
+import re
 import sys
+import random
 import pytest
 import pyline.pyline
 import pyline.colors
@@ -7,14 +9,14 @@ def test_using_colors(capsys):
     p = pyline.pyline.PyLine(colors=True, out=sys.stdout)
     p.say("this should be {0.black:black}")
     out, err = capsys.readouterr()
-    assert out == u"this should be \x1b[30mblack\x1b[0m\x1b[0m\n"
+    assert out == u"this should be \x1b[30mblack\x1b[0m\n"
     with p.no_colors():
         p.say("this should be {0.black:uninterpreted}")
         out, err = capsys.readouterr()
-        assert out == "this should be uninterpreted\x1b[0m\n"
+        assert out == "this should be uninterpreted\n"
     p.say("colored {0.black.on_red.underline:again}")
     out, err = capsys.readouterr()
-    assert out == "colored \x1b[30m\x1b[41m\x1b[4magain\x1b[0m\x1b[0m\n"
+    assert out == "colored \x1b[30;41;4magain\x1b[0m\n"
     with pytest.raises(AttributeError):
         p.say("There is no such color as {0.puce:puce}!")
 
@@ -22,7 +24,7 @@ def test_more_complex_formatting(capsys):
     p = pyline.pyline.PyLine(colors=True, out=sys.stdout)
     p.say("{0.red:hello}, {1}, how are {__colors.red:{you}}", "world", you="you")
     out, err = capsys.readouterr()
-    assert out == "\x1b[31mhello\x1b[0m, world, how are \x1b[31myou\x1b[0m\x1b[0m\n"
+    assert out == "\x1b[31mhello\x1b[0m, world, how are \x1b[31myou\x1b[0m\n"
 
 def test_colorscheme(capsys):
     cs = pyline.colors.ColorScheme(badwarning="yellow on_black",
@@ -31,6 +33,85 @@ def test_colorscheme(capsys):
     p.say("{0.badwarning.blink:danger will robinson}")
     p.say("{0.happiness:it's ok after all}")
     out, err = capsys.readouterr()
-    assert out == "\x1b[33m\x1b[40m\x1b[5mdanger will robinson\x1b[0m\x1b[0m\n\x1b[34m\x1b[1m\x1b[4mit's ok after all\x1b[0m\x1b[0m\n"
+    assert out == "\x1b[33;40;5mdanger will robinson\x1b[0m\n\x1b[34;1;4mit's ok after all\x1b[0m\n"
     with pytest.raises(AttributeError):
         p.say("{0.undefined:404}")
+
+def test_effect_chains_are_interned():
+    e = pyline.colors.e
+    chain = e.green.on_blue.bold
+    assert chain is e.green.on_blue.bold
+    assert chain is pyline.colors.EffectSequence.of(
+        (e.green, e.on_blue, e.bold))
+    assert str(chain) == "\x1b[32;44;1m"
+    assert chain.affixes == ("\x1b[32;44;1m", "\x1b[0m")
+    assert e.zb.bold.affixes is None
+    assert format(e.zb.bold, "a\0b") == "\x1b[1ma]b\x1b[0m"
+    cs = pyline.colors.ColorScheme(warn="yellow bold")
+    assert cs.warn is cs.warn is e.yellow.bold
+    cs.colormap['warn'] = ['red']
+    assert cs.warn is e.red
+    with pytest.raises(AttributeError):
+        e.green.puce
+
+def test_colormap_changes_reach_cached_templates(capsys):
+    cs = pyline.colors.ColorScheme(warn="red")
+    p = pyline.pyline.PyLine(colors=True, colorscheme=cs, out=sys.stdout)
+    p.say("{0.warn:hi}")
+    cs.colormap['warn'] = ['green']
+    p.say("{0.warn:hi}")
+    cs.colormap.update(warn=["blue"])
+    p.say("{0.warn:hi}")
+    cs.colormap = {'warn': ['yellow']}
+    p.say("{0.warn:hi}")
+    out, err = capsys.readouterr()
+    assert out == "\x1b[31mhi\x1b[0m\n\x1b[32mhi\x1b[0m\n" \
+        "\x1b[34mhi\x1b[0m\n\x1b[33mhi\x1b[0m\n"
+
+def styled_chars(text):
+    # (character, style) pairs as a terminal would display them
+    fg = bg = None
+    attrs = frozenset()
+    out = []
+    for tok in re.split('(\x1b\\[[0-9;]*m)', text):
+        if not re.match('\x1b\\[[0-9;]*m$', tok):
+            out.extend((c, fg, bg, attrs) for c in tok)
+            continue
+        for p in tok[2:-1].split(';'):
+            n = int(p or 0)
+            if n == 0:
+                fg = bg = None
+                attrs = frozenset()
+            elif 30 <= n <= 37:
+                fg = n
+            elif 40 <= n <= 47:
+                bg = n
+            else:
+                attrs = attrs | frozenset([n])
+    out.append(('END', fg, bg, attrs))
+    return out
+
+def test_optimize_sgr():
+    opt = pyline.colors.optimize_sgr
+    assert opt("\x1b[30m\x1b[41m\x1b[4magain\x1b[0m\x1b[0m") == \
+           "\x1b[30;41;4magain\x1b[0m"
+    assert opt("\x1b[31mA\x1b[0m\x1b[31mB\x1b[0m") == "\x1b[31mAB\x1b[0m"
+    assert opt("plain\x1b[0m") == "plain"
+    assert opt("\x1b[31mA\x1b[32mB\x1b[1mC\x1b[0m") == \
+           "\x1b[31mA\x1b[32mB\x1b[1mC\x1b[0m"
+    assert opt("\x1b[1mA\x1b[0m\x1b[31mB\x1b[0m") == "\x1b[1mA\x1b[0;31mB\x1b[0m"
+    rnd = random.Random(3)
+    codes = ['\x1b[0m', '\x1b[1m', '\x1b[4m', '\x1b[31m', '\x1b[32m',
+             '\x1b[44m', '\x1b[1;32m', '\x1b[m', 'a', 'b', ' ', '\x1b[K']
+    for i in range(3000):
+        text = ''.join(rnd.choice(codes) for j in range(rnd.randint(0, 15)))
+        assert styled_chars(opt(text)) == styled_chars(text)
+        # a bare \x1b[m may be respelled as the canonical \x1b[0m
+        assert len(opt(text)) <= len(text) + text.count('\x1b[m')
+
+def test_byte_savings_are_counted(capsys):
+    p = pyline.pyline.PyLine(colors=True, out=sys.stdout)
+    p.say("{0.red.bold:a}{0.red.bold:b}")
+    out, err = capsys.readouterr()
+    assert out == "\x1b[31;1mab\x1b[0m\n"
+    assert p.sgr_bytes_saved == len("\x1b[0m\x1b[31;1m\x1b[0m")
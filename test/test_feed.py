@@ -0,0 +1,68 @@
+import json
+import pytest
+import pyline.pyline
+from pyline.feed import AnswerFeed, FeedError
+from conftest import *
+
+def wizard(p):
+    name = p.ask(prompt="Name? ")
+    age = p.ask(prompt="Age? ", answer=int, default=30)
+    colors = p.ask(prompt="Favourite {key} color? ", gather=["light", "dark"])
+    pets = p.ask(prompt="Pet (blank to stop)? ", gather='')
+    size = p.choose("small", "large", header="Size")
+    ok = p.agree("Proceed? ")
+    return (name, age, colors, pets, size, ok)
+
+def test_feed_answers_without_prompting():
+    out = sio()
+    feed = AnswerFeed({0: "ann",
+                       "Age?": "",
+                       "dark": "black",
+                       "Favourite {key} color?": "white",
+                       "Pet (blank to stop)?": ["cat", "dog", ""],
+                       "Size": "2",
+                       "Proceed?": True})
+    p = pyline.pyline.PyLine(inp=sio(), out=out, feed=feed)
+    p.say("Welcome!")
+    assert wizard(p) == ("ann", 30, {"light": "white", "dark": "black"},
+                         ["cat", "dog"], "large", True)
+    assert out.getvalue() == "Welcome!\n"
+    assert [a[0] for a in feed.answered] == range(9)
+    assert feed.answered[1] == (1, "Age?", "")
+    assert feed.answered[3] == (3, "Favourite {key} color?", "black")
+    feed.reset()
+    assert wizard(p)[0] == "ann"
+
+def test_feed_from_json(tmpdir):
+    path = tmpdir.join("answers.json")
+    path.write(json.dumps(["bob", 41, "red", "blue", "", "s", "y"]))
+    p = pyline.pyline.PyLine(inp=sio(), out=sio(), feed=str(path))
+    assert wizard(p) == ("bob", 41, {"light": "red", "dark": "blue"}, [],
+                         "small", True)
+    path.write(json.dumps({"0": "ann", "Age?": 52, "light": "red",
+                           "dark": "blue", "4": "", "Size": "l", "6": False}))
+    p = pyline.pyline.PyLine(inp=sio(), out=sio(), feed=str(path))
+    assert wizard(p) == ("ann", 52, {"light": "red", "dark": "blue"}, [],
+                         "large", False)
+
+def test_feed_errors():
+    p = pyline.pyline.PyLine(inp=sio(), out=sio(), feed=["ann", "old"])
+    assert p.ask(prompt="Name? ") == "ann"
+    with pytest.raises(FeedError) as e:
+        p.ask(prompt="Age? ", answer=int)
+    assert "'old' to question 1 ('Age?') was rejected" in str(e.value)
+    with pytest.raises(FeedError):
+        p.ask(prompt="More? ")
+    # not strict: unanswered questions are asked as usual
+    out = sio()
+    p = pyline.pyline.PyLine(inp=sio("typed\n"), out=out,
+                             feed=AnswerFeed({}, strict=False))
+    assert p.ask(prompt="Name? ") == "typed"
+    assert no_clear(out.getvalue()) == "Name? "
+
+def test_feed_skips_paging():
+    out = sio()
+    p = pyline.pyline.PyLine(inp=sio(), out=out, page_at=3, feed=["x"])
+    p.say("\n".join("line %d" % i for i in range(10)))
+    assert p.ask(prompt="Go? ") == "x"
+    assert out.getvalue().count("line") == 10
@@ -3,6 +3,7 @@ import pytest
 import pyline.pyline
 import pyline.listdisplay
 import pyline.menu
+import pyline.utils
 from conftest import *
 
 def test_layouts():
@@ -26,8 +27,8 @@ pick one:
     v = no_clear(out.getvalue())
     assert v == '''\
 pick one:
-1. foo                     3. baz
-2. bar                     4. this one is longer
+1. foo                 3. baz
+2. bar                 4. this one is longer
 ? '''
     reset(out)
     set_inp(inp, '1')
@@ -35,7 +36,7 @@ pick one:
     v = no_clear(out.getvalue())
     assert v == '''\
 pick one:
-1. foo                     2. bar                     3. baz
+1. foo                 2. bar                 3. baz
 4. this one is longer
 ? '''
     reset(out)
@@ -88,3 +89,94 @@ def test_shell():
     set_inp(inp, "ls")
     res = p.choose(m)
     assert os.path.split(__file__)[1] in res
+
+def test_candidate_index_is_updated_in_place():
+    inp = sio()
+    out = sio()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    m = pyline.menu.Menu(["alpha", ("beta", None, "beta help")])
+    m.pyline = p
+    idx = m.candidate_index()
+    m.add_choice("gamma")
+    m.add_hidden("delta")
+    assert m.candidate_index() is idx
+    assert [str(i) for i in m.items] == ["alpha", "beta", "gamma", "help"]
+    fresh = pyline.utils.Trie(m.options())
+    assert sorted(idx) == sorted(fresh)
+    for key in ("3", "4", "gam", "del", "he"):
+        assert str(idx.get_by_prefix(key)) == str(fresh.get_by_prefix(key))
+    set_inp(inp, "3\n")
+    assert p.choose(m) == "gamma"
+    set_inp(inp, "delt\n")
+    assert p.choose(m) == "delta"
+    m.items.append(pyline.menu.MenuChoice("epsilon"))
+    assert m.candidate_index() is not idx
+    assert str(m.candidate_index().get_by_prefix("eps")) == "epsilon"
+
+def test_window_layout():
+    inp = sio(">\n>\n-\n<\n>\n>\n>\n>\n>\n48\n")
+    out = sio()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    names = ["item %d" % i for i in range(1, 51)]
+    m = pyline.menu.Menu(names, layout=pyline.menu.Window(size=4),
+                         header="pick")
+    assert p.choose(m) == "item 48"
+    screens = no_clear(out.getvalue()).split("pick:\n")[1:]
+    assert len(screens) == 10
+    assert screens[0] == "1. item 1\n2. item 2\n3. item 3\n4. item 4\n" \
+        "(1-4 of 50; < > to page, - + to scroll)\n? "
+    firsts = [s.split('.')[0] for s in screens]
+    assert firsts == ['1', '5', '9', '8', '4', '8', '12', '16', '20', '24']
+    m.offset = 1000
+    assert str(m).startswith("pick:\n47. item 47\n48. item 48\n"
+                             "49. item 49\n50. item 50\n(47-50 of 50;")
+
+def test_window_items_win_over_navigation_keys():
+    ops = ["==", ">", "<", "!=", "in", "not in"]
+    inp = sio("+\n>\n")
+    out = sio()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    m = pyline.menu.Menu(ops, layout=pyline.menu.Window(size=2), header="op")
+    assert p.choose(m) == ">" # "+" isn't an item, so it scrolls
+    screens = no_clear(out.getvalue()).split("op:\n")[1:]
+    assert [s.split('.')[0] for s in screens] == ['1', '2']
+    assert "Answer could not be processed" not in out.getvalue()
+    fed = pyline.pyline.PyLine(inp=sio(), out=sio(), feed=["<", "+"])
+    m = pyline.menu.Menu(ops + ["+"], layout=pyline.menu.Window(size=2))
+    assert fed.choose(m) == "<"
+    assert fed.choose(m) == "+"
+
+def test_options_are_cached_and_exact_keys_win():
+    inp = sio("1\n10\nitem 1\n")
+    out = sio()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    m = pyline.menu.Menu(["item %d" % i for i in range(1, 13)] + ["item 1x"])
+    m.pyline = p
+    opts = m.options()
+    assert m.options() is opts
+    proxy = opts[0]
+    assert str(proxy) == "1" and proxy.name == "item 1" and proxy() == "item 1"
+    assert p.choose(m) == "item 1"
+    assert p.choose(m) == "item 10"
+    assert p.choose(m) == "item 1"
+    assert out.getvalue().count("Ambiguous") == 0
+    m.add_choice("item 14")
+    assert m.options() is not opts
+    set_inp(inp, "14\nitem 14\n")
+    assert p.choose(m) == "item 14"
+    assert p.choose(m) == "item 14"
+
+def test_letter_index():
+    keys = [pyline.menu.letter_key(i) for i in range(52 * 53 + 5)]
+    assert keys[:3] == ['a', 'b', 'c'] and keys[25:28] == ['z', 'A', 'B']
+    assert keys[51:55] == ['Z', 'aa', 'ab', 'ac']
+    assert keys[52 * 53 - 1:52 * 53 + 1] == ['ZZ', 'aaa']
+    assert len(set(keys)) == len(keys)
+    inp = sio("a\naa\nZ\n")
+    out = sio()
+    p = pyline.pyline.PyLine(inp=inp, out=out, page_at=100)
+    m = pyline.menu.Menu(["item %d" % i for i in range(60)],
+                         index=pyline.menu.letter)
+    assert [p.choose(m) for i in range(3)] == ["item 0", "item 52", "item 51"]
+    assert "\nah. item 59\n" in no_clear(out.getvalue())
+    assert m.index_key(59) == "ah"
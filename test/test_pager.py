@@ -0,0 +1,84 @@
+import os
+import re
+import pytest
+import tempfile
+import pyline.pyline
+from pyline import pager
+from conftest import *
+
+@pytest.fixture
+def logfile(request):
+    fd, path = tempfile.mkstemp()
+    os.write(fd, ''.join("line %d%s\n" % (i, " match" if i % 250 == 7 else "")
+                         for i in range(1000)))
+    os.close(fd)
+    request.addfinalizer(lambda: os.remove(path))
+    return path
+
+@pytest.mark.parametrize("text", ["", "\n", "a", "a\n", "a\n\nb", "a\nb\n\n",
+                                  "x\n" * 5000 + "tail"])
+def test_line_index(text):
+    index = pager.LineIndex(text)
+    index.chunk = 3
+    index.start()
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    assert len(index) == len(lines)
+    for (n, line) in enumerate(lines):
+        start, end = index.span(n)
+        assert text[start:end] == line
+        assert index.line_at(start) == n
+    assert index.span(len(lines)) is None
+
+def test_pager(logfile):
+    out = sio()
+    inp = sio("\n\nb\n50%\n/match\nn\nG\n/nomatch\nq\n")
+    p = pyline.pyline.PyLine(out=out, inp=inp, page_at=4)
+    p.page_file(logfile)
+    text = no_clear(out.getvalue())
+    assert text.startswith(
+        "line 0\nline 1\nline 2\nline 3\n-- lines 1-4 of ")
+    pages = [page.split('\n')[0] for page in
+             re.split('-- lines [^\n]*? -- ', text)[:-1]]
+    assert pages == ['line 0', 'line 4', 'line 8', 'line 4', 'line 506',
+                     'line 507 match', 'line 757 match', 'line 996',
+                     'line 996']
+    assert "line 999\nPattern not found\n-- lines 997-1000 of 1000 (100%) -- " in text
+
+def test_pager_wraps_long_lines(logfile):
+    p = pyline.pyline.PyLine(out=sio(), inp=sio(), page_at=3, wrap_at=6)
+    with open(logfile) as f:
+        pg = pager.Pager(p, f, background=False)
+        try:
+            pg.command("998")
+            assert pg.render() == "line\n997\nline"
+            assert pg.status() == "-- lines 998-999 of 1000 (99%) -- "
+            pg.command("") # the rest of line 999 first
+            assert pg.render() == "998\nline\n999"
+            assert pg.status() == "-- lines 999-1000 of 1000 (100%) -- "
+            pg.command("f")
+            assert (pg.top, pg.skip) == (998, 1)
+            pg.command("b")
+            assert pg.render() == "line\n997\nline"
+            pg.command("G")
+            assert pg.render() == "998\nline\n999"
+            pg.command("5000")
+            assert pg.render() == "998\nline\n999"
+        finally:
+            pg.close()
+
+def test_pager_pages_through_a_line_longer_than_a_page(tmpdir):
+    path = tmpdir.join("long.txt")
+    path.write("short\n" + " ".join("w%d" % i for i in range(10)) + "\nend\n")
+    p = pyline.pyline.PyLine(out=sio(), inp=sio(), page_at=3, wrap_at=6)
+    pg = pager.Pager(p, str(path), background=False)
+    pages = []
+    for i in range(4):
+        pages.append((pg.render(), pg.status()))
+        pg.command("")
+    pg.close()
+    assert pages == [("short\nw0 w1\nw2 w3", "-- lines 1-2 of 3 (90%) -- "),
+                     ("w4 w5\nw6 w7\nw8 w9", "-- lines 2-2 of 3 (90%) -- "),
+                     ("end", "-- lines 3-3 of 3 (100%) -- "),
+                     ("end", "-- lines 3-3 of 3 (100%) -- ")]
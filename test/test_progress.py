@@ -0,0 +1,108 @@
+import time
+import threading
+import pytest
+import pyline.pyline
+from pyline import progress
+from pyline.session import InputChannel
+from conftest import *
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_formatting():
+    assert progress.format_duration(0) == "0:00"
+    assert progress.format_duration(61.6) == "1:02"
+    assert progress.format_duration(3723) == "1:02:03"
+    assert progress.format_rate(2.25) == "2.2/s"
+    assert progress.format_rate(1234.5) == "1234/s"
+
+def test_bar_render():
+    clock = Clock()
+    p = progress.Progress(pyline.pyline.PyLine(out=sio()), clock=clock)
+    b = progress.Bar(p, "files", total=200)
+    b.count = 50
+    b.counters = {"errors": 2}
+    b.status = "a.txt"
+    clock.now += 10
+    line = b.render(clock(), 79)
+    assert line == "files [#######" + "." * 23 + \
+        "] 50/200 25% 5.0/s ETA 0:30 errors=2 a.txt"
+    assert len(line) == 79
+    assert b.render(clock(), 79, graphic=False) == \
+        "files: 50/200 25% 5.0/s ETA 0:30 errors=2 a.txt"
+    assert b.render(clock(), 20) == "files: 50/200 25% 5."
+    b.total = None
+    assert b.render(clock(), 79) == "files: 50 5.0/s errors=2 a.txt"
+
+def test_redrawn_in_place_at_limited_rate():
+    out = sio()
+    clock = Clock()
+    p = pyline.pyline.PyLine(out=out)
+    with p.progress(fps=8, tty=True, clock=clock) as prog:
+        items = prog.bar("items", total=1000)
+        bytes = prog.bar("bytes")
+        for i in range(1000):
+            clock.now += 1.0 / 1024
+            items.update(status="item %d" % i)
+            bytes.update(512)
+    # the first, one per 1/8s of updates, and the last
+    assert prog.frames == 1 + 7 + 1
+    text = out.getvalue()
+    assert text.count('\n') == 1 + 2 * 7 + 2
+    frames = text.split('\x1b[A\x1b[A')
+    assert len(frames) == 9 - 1
+    assert frames[-1].split('\n') == [
+        "\r\x1b[Kitems [" + "#" * 31 + "] 1000/1000 100% 1024/s ETA 0:00 item 999",
+        "\r\x1b[Kbytes: 512000 524288/s", ""]
+    prog.close()
+    items.update()
+    assert prog.frames == 9
+
+def test_plain_lines_when_not_a_tty():
+    out = sio()
+    clock = Clock()
+    p = pyline.pyline.PyLine(out=out)
+    prog = p.progress(interval=5, clock=clock)
+    assert not prog.tty
+    b = prog.bar("rows", total=100)
+    for i in range(100):
+        clock.now += 0.25
+        b.update()
+    prog.close()
+    assert out.getvalue().split('\n') == [
+        "rows: 0/100 0% 0.0/s",
+        "rows: 20/100 20% 4.0/s ETA 0:20",
+        "rows: 40/100 40% 4.0/s ETA 0:15",
+        "rows: 60/100 60% 4.0/s ETA 0:10",
+        "rows: 80/100 80% 4.0/s ETA 0:05",
+        "rows: 100/100 100% 4.0/s ETA 0:00",
+        ""]
+
+def test_updates_dont_wait_for_questions():
+    inp = InputChannel()
+    out = sio()
+    clock = Clock()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    prog = p.progress(fps=8, tty=True, clock=clock)
+    b = prog.bar("jobs")
+    answers = []
+    asking = threading.Thread(target=lambda: answers.append(p.ask(prompt="Name? ")))
+    asking.daemon = True
+    asking.start()
+    while "Name? " not in out.getvalue():
+        time.sleep(0.001)
+    clock.now += 1
+    worker = threading.Thread(target=lambda: [b.update() for i in range(3)])
+    worker.start()
+    worker.join(1)
+    assert not worker.is_alive()
+    assert prog.frames == 1 # skipped while the question is asked
+    inp.feed("bob\n")
+    asking.join()
+    b.update()
+    assert prog.frames == 2 and out.getvalue().endswith("jobs: 4 4.0/s\n")
+    prog.close()
+    assert prog.frames == 2
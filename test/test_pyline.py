@@ -3,6 +3,7 @@ import pytest
 import pyline.pyline
 import pyline.question
 import pyline.answers
+import pyline.system
 from conftest import *
 
 def test_agree():
@@ -90,6 +91,35 @@ def test_character_reading():
     ans = p.ask(q)
     assert ans == 1
 
+def test_piped_input_is_read_a_line_at_a_time():
+    data = sio("secret\nabcdefgh\nxy\bz\n12\nlast\n")
+    calls = []
+    class Inp(object):
+        def readline(self, n=-1):
+            calls.append('readline')
+            return data.readline(n)
+        def read(self, n):
+            calls.append('read')
+            return data.read(n)
+        def isatty(self):
+            return False
+    out = sio()
+    p = pyline.pyline.PyLine(inp=Inp(), out=out)
+    assert p.ask(prompt="Password: ", echo="*") == "secret"
+    assert p.ask(prompt="Code: ", echo=False, limit=4) == "abcd"
+    assert p.ask(prompt="Rest: ", echo="*") == "efgh"
+    assert p.ask(prompt="Edited: ", echo="*") == "xz"
+    assert p.ask(prompt="Digit: ", answer=int, character=True) == 1
+    assert p.ask(prompt="Digit: ", answer=int,
+                 character=pyline.question.getc) == 2
+    assert p.ask(prompt="Last: ") == ""
+    assert p.ask(prompt="Last: ") == "last"
+    # one read per answer, never more input than the answer needs
+    assert len(calls) == 8
+    assert p.pending_input == ""
+    assert no_clear(out.getvalue()).startswith(
+        "Password: ******\nCode: \nRest: ****\nEdited: **\b\x1b[P*\n")
+
 def test_confirm():
     inp = sio("junk.txt\nno\nsave.txt\ny\n")
     out = sio()
@@ -138,6 +168,14 @@ def test_empty():
     ans = p.ask(q)
     assert ans == 'yes'
 
+def test_say_empty_text():
+    out = sio()
+    p = pyline.pyline.PyLine(out=out, colors=True)
+    p.say("{name}", name="")
+    p.say("{0.red:}")
+    p.say("")
+    assert out.getvalue() == "\n\n"
+
 def test_gather():
     inp = sio("Bob\nCarol\nTed\nAlice\n\n")
     p = pyline.pyline.PyLine(inp=inp)
@@ -168,15 +206,163 @@ def test_listdisplay():
     lines = p.listdisplay(digits)
     assert no_clear(lines) == 'one\ntwo\nthree\nfour\nfive\n\x1b[34msix\nseven\neight\nnine\nten'
     coldown = p.listdisplay(digits, ld.columns_down)
-    assert no_clear(coldown) == 'one        three      five       seven      nine     \ntwo        four       \x1b[34msix        eight      ten      '
+    assert no_clear(coldown) == 'one    two    three  four   five   \x1b[34msix    seven  eight  nine   ten  '
     colacross = p.listdisplay(digits, ld.columns_across, 3)
     assert no_clear(colacross) == '''\
-one        two        three    \n\
-four       five       \x1b[34msix      \n\
-seven      eight      nine     \n\
-ten      '''
+one    two    three\n\
+four   five   \x1b[34msix  \n\
+seven  eight  nine \n\
+ten  '''
     inline = p.listdisplay(digits, ld.inline, "; ")
     assert no_clear(inline) == 'one; two; three; four; five; \x1b[34msix; seven; eight; nine; or ten'
     twenty = ['12345678901234567890'] * 5
-    assert no_clear(p.listdisplay(twenty, ld.columns_across)) == '12345678901234567890      12345678901234567890      12345678901234567890    \n12345678901234567890      12345678901234567890    '
+    assert no_clear(p.listdisplay(twenty, ld.columns_across)) == '12345678901234567890  12345678901234567890  12345678901234567890\n12345678901234567890  12345678901234567890'
+
+
+def test_completer():
+    names = ['host%05d' % i for i in range(20000)] + ['other']
+    q = pyline.question.Question("Host? ", names)
+    cands = q.answer.get_completions()
+    assert cands is q.answer.get_completions()
+    c = pyline.pyline.Completer(cands, limit=15)
+    found = []
+    state = 0
+    while True:
+        m = c('host0001', state)
+        if m is None: break
+        found.append(m)
+        state += 1
+    assert found == ['host%05d' % i for i in range(10, 20)]
+    assert c('host', 0) == 'host00000'
+    assert c('host', 14) == 'host00014'
+    assert c('host', 15) is None
+    assert c('oth', 0) == 'other'
+    assert c('zzz', 0) is None
+
+def test_say_stream():
+    out = sio()
+    p = pyline.pyline.PyLine(out=out, inp=sio("\nq"), wrap_at=58, page_at=3)
+    consumed = []
+    def chunks():
+        for i in range(100):
+            consumed.append(i)
+            yield "line %d " % i
+            yield "and so on " * 6 + "\n" if i % 2 else "\n"
+    p.say_stream(chunks())
+    prompt = "-- press enter/return to continue or q to stop -- \n"
+    assert no_clear(out.getvalue()) == \
+        "line 0\nline 1" + " and so on" * 5 + "\nand so on\n" + prompt + \
+        "line 2\nline 3" + " and so on" * 5 + "\nand so on\n" + prompt + "...\n"
+    assert len(consumed) < 10
+    reset(out)
+    p.page_at = 10
+    p.say_file(sio("a\n\nb " * 2), bufsize=3)
+    assert out.getvalue() == "a\n\nb a\n\nb\n"
+
+def test_listdisplay_iterables_and_widths():
+    p = pyline.pyline.PyLine(wrap_at=20)
+    from pyline import listdisplay as ld
+    words = ["a", "{0.red:bbbb}", "cc", "d", "eee"]
+    for mode in (ld.columns_across, ld.columns_down, ld.rows):
+        assert p.listdisplay(iter(words), mode) == p.listdisplay(words, mode)
+    # the widest item is colored: columns are padded to its visible width
+    assert no_clear(p.listdisplay(words, ld.columns_across)) == \
+        'a     \x1b[31mbbbb  cc  \nd     eee '
+    assert p.listdisplay(iter([]), ld.columns_down) == ''
+    assert p.listdisplay(["x" * 30, "y"], ld.columns_down) == \
+        "x" * 30 + "\ny" + " " * 29
+
+def test_terminal_session(monkeypatch):
+    import os, termios
+    master, slave = os.openpty()
+    inp = os.fdopen(slave)
+    out = sio()
+    writes = []
+    write = out.write
+    class Out(object):
+        def write(self, s):
+            writes.append(s)
+            write(s)
+        def __getattr__(self, k):
+            return getattr(out, k)
+    calls = []
+    real = termios.tcsetattr
+    monkeypatch.setattr(termios, "tcsetattr",
+                        lambda *a: (calls.append(a[1]), real(*a)))
+    os.write(master, "hunter3\nyfoo\nx")
+    p = pyline.pyline.PyLine(inp=inp, out=Out())
+    assert p.ask(prompt="Password: ", echo="*") == "hunter3"
+    assert len(calls) == 2
+    # the whole paste was read at once, and echoed in one batch
+    assert p.pending_input == "yfoo\nx"
+    assert out.getvalue() == "Password: " + "*" * 7 + "\n"
+    assert "*" * 7 in writes
+    assert p.agree("ok? ", character=True) is True
+    assert len(calls) == 4
+    assert p.ask(prompt="more? ") == "foo"
+    assert p.pending_input == "x"
+    os.close(master)
+    inp.close()
+
+def test_resize_during_read():
+    import os, fcntl, struct, termios, signal, threading, time
+    master, slave = os.openpty()
+    fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('hhhh', 24, 80, 0, 0))
+    inp = os.fdopen(slave)
+    pyline.system.terminal_size(inp) # watching for resizes from now on
+    p = pyline.pyline.PyLine(inp=inp, out=sio())
+    def type_slowly():
+        time.sleep(0.05) # until the read is waiting
+        os.kill(os.getpid(), signal.SIGWINCH)
+        time.sleep(0.05)
+        os.write(master, "hunter2\nx")
+        time.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGWINCH)
+        time.sleep(0.05)
+        os.write(master, "y")
+    typist = threading.Thread(target=type_slowly)
+    typist.start()
+    assert p.ask(prompt="Password: ", echo="*") == "hunter2"
+    assert p.ask(prompt="Letter: ", limit=2) == "xy"
+    typist.join()
+    os.close(master)
+    inp.close()
+
+def test_terminal_size(monkeypatch):
+    import os, sys, fcntl, struct, termios, signal
+    master, slave = os.openpty()
+    def resize(cols, rows):
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('hhhh', rows, cols, 0, 0))
+    resize(132, 40)
+    tty = os.fdopen(slave, 'w')
+    assert pyline.system.terminal_size(tty) == (132, 40)
+    monkeypatch.setattr(sys, "stdout", tty)
+    pyline.system._sizes.clear()
+    assert pyline.system.terminal_size() == (132, 40)
+    fixed = pyline.pyline.PyLine(out=tty)
+    tracking = pyline.pyline.PyLine(out=tty, track_size=True)
+    narrow = pyline.pyline.PyLine(out=tty, track_size=True, wrap_at=60)
+    for p in (fixed, tracking):
+        assert (p.cols, p.rows, p.wrap_at, p.page_at) == (132, 40, 132, 38)
+    resize(100, 30)
+    assert tracking.wrap_at == 132 # cached until we're told of the resize
+    os.kill(os.getpid(), signal.SIGWINCH)
+    assert (tracking.cols, tracking.rows, tracking.wrap_at, tracking.page_at) \
+        == (100, 30, 100, 28)
+    assert (narrow.wrap_at, narrow.page_at) == (60, 28)
+    assert (fixed.wrap_at, fixed.page_at) == (132, 38)
+    tty.close()
+    os.close(master)
 
+def test_import_is_cheap():
+    # short-lived programs pay for everything imported with pyline: these
+    # are only to be loaded when first needed
+    import os, sys, subprocess
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output([sys.executable, '-c',
+        'import sys, pyline.pyline\n'
+        'print " ".join(m for m in sys.modules if sys.modules[m])'], cwd=root)
+    slow = set(['readline', 'curses', 'termios', 'fcntl', 'subprocess',
+                'scandir', 'ctypes', 'threading', 'mmap', 'textwrap',
+                'pyline.pager'])
+    assert slow & set(out.split()) == set()
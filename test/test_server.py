@@ -0,0 +1,75 @@
+import os
+import socket
+import threading
+import pytest
+import pyline.menu
+from pyline import server
+from conftest import *
+
+def session(p):
+    def echo(choice, menu, rest):
+        menu.pyline.say("{0.red:%s} (%d columns)" % (rest.upper(), menu.pyline.cols))
+    m = pyline.menu.Menu([("echo", echo),
+                          pyline.menu.quit_shell("quit", "leave")],
+                         shell=True, header="commands", prompt="> ")
+    p.shell(m)
+
+class Client(object):
+    def __init__(self, family, address, hello):
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.sock.sendall(hello + "\r\n")
+        self.received = ''
+    def expect(self, text):
+        while text not in self.received:
+            data = self.sock.recv(4096)
+            assert data, self.received
+            self.received += data
+        before, _, self.received = self.received.partition(text)
+        return before + text
+    def send(self, line):
+        self.sock.sendall(line + "\r\n")
+    def close(self):
+        self.sock.close()
+
+@pytest.fixture(params=["tcp", "unix"])
+def served(request, tmpdir):
+    if request.param == "tcp":
+        srv = server.PyLineServer(("127.0.0.1", 0), session)
+        family = socket.AF_INET
+    else:
+        srv = server.UnixPyLineServer(str(tmpdir.join("sock")), session)
+        family = socket.AF_UNIX
+    t = threading.Thread(target=srv.serve_forever)
+    t.daemon = True
+    t.start()
+    def stop():
+        srv.shutdown()
+        srv.server_close()
+    request.addfinalizer(stop)
+    return family, srv.server_address
+
+def test_parse_hello():
+    assert server.parse_hello("") == server.defaults
+    assert server.parse_hello("cols=132 colors=0 x=1 rows=?\r\n") == \
+        {'cols': 132, 'rows': 24, 'colors': 0}
+
+def test_sessions(served):
+    family, address = served
+    plain = Client(family, address, "cols=132 colors=0")
+    color = Client(family, address, "")
+    # many sessions at once, most of them idle
+    idle = [Client(family, address, "") for i in range(30)]
+    for c in idle:
+        c.expect("> ")
+    assert "commands" in plain.expect("> ")
+    color.expect("> ")
+    plain.send("echo hi")
+    assert plain.expect("> ") == "HI (132 columns)\n> "
+    color.send("e there")
+    out = color.expect("> ")
+    assert "\x1b[31mTHERE" in out and "(80 columns)" in out
+    plain.send("quit")
+    assert plain.sock.recv(4096) == ""
+    for c in idle + [plain, color]:
+        c.close()
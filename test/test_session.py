@@ -0,0 +1,62 @@
+import time
+import threading
+import pyline.pyline
+from pyline.session import PyLineSession, InputChannel
+from conftest import *
+
+def wizard(p):
+    name = p.ask(prompt="Name? ")
+    pin = p.ask(prompt="PIN: ", echo="*", limit=4)
+    size = p.choose("small", "large", header="Size")
+    return (name, pin, size, p.agree("Sure? ", character=True))
+
+def wait_for(session, text):
+    seen = ''
+    deadline = time.time() + 5
+    while text not in seen:
+        assert time.time() < deadline, seen
+        seen += session.drain()
+        time.sleep(0.001)
+    return seen
+
+def test_input_channel():
+    inp = InputChannel()
+    inp.feed("ab\ncd")
+    assert inp.readline() == "ab\n"
+    assert inp.read(10) == "cd"
+    inp.feed("efgh")
+    assert inp.readline(2) == "ef"
+    inp.close()
+    assert inp.readline() == "gh"
+    assert inp.read(1) == ""
+
+def test_sessions_do_not_block():
+    wakeups = []
+    sessions = [PyLineSession(wizard, notify=lambda: wakeups.append(1)).start()
+                for i in range(20)]
+    for i, s in enumerate(sessions):
+        assert wait_for(s, "Name? ")
+        s.feed("user%d\n" % i)
+    for s in sessions:
+        assert wait_for(s, "PIN: ")
+        s.feed("1234")
+    for s in sessions:
+        out = wait_for(s, "? ")
+        assert "****" in out and "1. small" in out
+        s.feed("lar\n")
+    for s in sessions:
+        wait_for(s, "Sure?")
+        s.feed("y")
+    for i, s in enumerate(sessions):
+        assert s.wait(5)
+        assert s.error is None
+        assert s.result == ("user%d" % i, "1234", "large", True)
+    assert wakeups
+
+def test_session_eof():
+    s = PyLineSession(wizard).start()
+    wait_for(s, "Name? ")
+    s.close()
+    assert s.wait(5)
+    assert isinstance(s.error, EOFError)
+    assert s.result is None
@@ -0,0 +1,150 @@
+import random
+import pytest
+from pyline import utils
+
+def reference_lookup(words, prefix):
+    matches = [w for w in words if w.startswith(prefix)]
+    if not matches:
+        raise utils.NotAPrefix
+    if len(matches) > 1:
+        raise utils.NotAUniquePrefix
+    return matches[0]
+
+def test_trie_matches_linear_scan():
+    rnd = random.Random(1234)
+    words = set()
+    while len(words) < 500:
+        words.add(''.join(rnd.choice('abc') for i in range(rnd.randint(1, 8))))
+    words = sorted(words)
+    t = utils.Trie(words)
+    assert sorted(t) == words
+    for w in words:
+        assert w in t
+        assert w[:-1] in t or w[:-1] not in words
+    prefixes = set(w[:i] for w in words for i in range(len(w)+1))
+    prefixes.update(['abcabcabca', 'd', 'ad'])
+    for p in prefixes:
+        try:
+            expected = reference_lookup(words, p)
+        except (utils.NotAPrefix, utils.NotAUniquePrefix), e:
+            with pytest.raises(type(e)):
+                t.get_by_prefix(p)
+        else:
+            assert t.get_by_prefix(p) == expected
+        if any(w.startswith(p) for w in words):
+            assert sorted(t.get_all_by_prefix(p)) == \
+                   [w for w in words if w.startswith(p)]
+
+def test_trie_values_and_replace():
+    t = utils.Trie([1, 22, 23])
+    assert t.get_by_prefix('1') == 1
+    t.insert('1', 'one')
+    assert t.get_by_prefix('1') == 1
+    t.insert('1', 'one', replace=True)
+    assert t.get_by_prefix('1') == 'one'
+    with pytest.raises(utils.NotAUniquePrefix):
+        t.get_by_prefix('2')
+    with pytest.raises(utils.NotAPrefix):
+        utils.Trie([]).get_by_prefix('')
+    long_word = 'x' * 100000
+    assert list(utils.Trie([long_word])) == [long_word]
+
+def test_wrap_matches_textwrap_on_plain_text():
+    import textwrap
+    rnd = random.Random(99)
+    pieces = ['a', 'bb', 'word', 'hyphen-ated', '--', ' ', '  ', '\t', 'x'*30,
+              'end.', '-b', 'goof-ball,']
+    for i in range(2000):
+        text = ''.join(rnd.choice(pieces) for j in range(rnd.randint(0, 25)))
+        width = rnd.randint(1, 40)
+        assert utils.wrap(text, width) == textwrap.wrap(text, width), (text, width)
+
+def test_wrap_ignores_escapes():
+    red, clear = '\x1b[31m', '\x1b[0m'
+    text = ' '.join(red + 'word' + clear for i in range(5))
+    lines = utils.wrap(text, 10)
+    assert [utils.real_len(l) for l in lines] == [9, 9, 4]
+    assert ''.join(lines).count('\x1b') == 10
+    lines = utils.wrap(red + 'x' * 12 + clear, 5)
+    assert lines == [red + 'xxxxx', 'xxxxx', 'xx' + clear]
+    with pytest.raises(ValueError):
+        utils.wrap('text', 0)
+
+def test_wrap_keeps_every_escape():
+    rnd = random.Random(7)
+    pieces = ['a', 'word', 'hyphen-ated', ' ', '  ', 'x'*30, '\x1b[31m',
+              '\x1b[0m', '\x1b[1;44m']
+    for i in range(2000):
+        text = ''.join(rnd.choice(pieces) for j in range(rnd.randint(0, 25)))
+        width = rnd.randint(1, 40)
+        lines = utils.wrap(text, width)
+        plain = utils._escape_pat.sub('', text)
+        assert [utils._escape_pat.sub('', l) for l in lines if
+                utils.real_len(l)] == utils.wrap(plain, width)
+        assert utils._escape_pat.findall(''.join(lines)) == \
+               utils._escape_pat.findall(text)
+
+class Point(object):
+    x = 3
+    y = [10, 20]
+
+def test_format_template_agrees_with_str_format():
+    from pyline import colors
+    scheme = colors.ColorScheme(warn="yellow on_black", odd="zb")
+    templates = ["plain", "{{literal}}", "{1}, {2!r:>6}", "{name:^9}",
+                 "{0.red:hello {1}}, {__colors.green.bold:{name}}",
+                 "{0.warn.blink:x}", "{__colors.odd:a\0b}{0.clear:done}",
+                 "{1.x:>{1.x}} {1.y[1]}", "{0.red}", "{name!s:{width}}"]
+    vals = ("one", Point())
+    for sch in (colors.e, scheme, colors.none):
+        for t in templates:
+            if sch is colors.e and ('warn' in t or 'odd' in t):
+                continue
+            args = (Point(),) if '{1.' in t else vals
+            keys = {'name': 'nm', 'width': 5}
+            assert utils.format_template(t, sch, args, keys) == \
+                   t.format(sch, __colors=sch, *args, **keys)
+            assert utils.format_template(t, sch, args, keys) == \
+                   t.format(sch, __colors=sch, *args, **keys)
+    with pytest.raises(AttributeError):
+        utils.format_template("{0.puce:x}", colors.e)
+    assert utils.format_template("{} {}", colors.e, ("a",)) == \
+           "{} {}".format(colors.e, "a")
+
+def test_effectize_merged_agrees_with_optimize_sgr():
+    from pyline import colors
+    scheme = colors.ColorScheme(warn="yellow bold")
+    templates = ["plain", "{0.red:a}{0.red:b} ", "{0.warn:{name}}!\n",
+                 "{0.red:x}{1}{0.red:y}", "{name}", "{0.bold:}{1} \t",
+                 "{0.red:x}\x1b[0m", "\x1b[1m{1}"]
+    for t in templates:
+        for vals, keys in [(("v",), {"name": "n"}),
+                           (("\x1b[0mv",), {"name": "\x1b[32mn"}),
+                           ((colors.e.blue,), {"name": ""})]:
+            for sch in (colors.e, scheme):
+                if sch is colors.e and 'warn' in t:
+                    continue
+                for i in range(2): # compiled, then cached
+                    text = utils.effectize_string(t, vals, keys, sch)
+                    merged = colors.optimize_sgr(text)
+                    result = utils.effectize_merged(t, sch, vals, keys)
+                    # an empty value may leave codes with no text between
+                    # them (displayed the same), but nothing else
+                    assert colors.optimize_sgr(result[0]) == merged
+                    if keys["name"]:
+                        assert result == (merged, len(text) - len(merged))
+
+def test_generation_cache_is_bounded():
+    c = utils.GenerationCache(10)
+    for i in range(100):
+        c[i] = i
+        assert c.get(0) == 0
+    assert len(c.young) + len(c.old) <= 20
+    assert c.get(50) is None
+
+def test_iter_lines():
+    text = "one\ntwo\n\nthree four\nfive\n\n"
+    for size in range(1, len(text) + 1):
+        chunks = [text[i:i+size] for i in range(0, len(text), size)]
+        assert list(utils.iter_lines(chunks)) == text.split('\n')[:-1]
+    assert list(utils.iter_lines(["a", "b", "", "c"])) == ["abc"]
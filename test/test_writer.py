@@ -0,0 +1,140 @@
+import re
+import time
+import threading
+import pyline.pyline
+from pyline.session import InputChannel
+from conftest import *
+
+class Out(object):
+    """Output that records each write, taking ``delay`` seconds over it."""
+    def __init__(self, delay=0):
+        self.writes = []
+        self.delay = delay
+    def write(self, s):
+        if self.delay:
+            time.sleep(self.delay)
+        self.writes.append(s)
+    def flush(self):
+        pass
+    def isatty(self):
+        return False
+    def getvalue(self):
+        return ''.join(self.writes)
+
+def run_workers(p, n=8, lines=50):
+    def work(i):
+        for j in range(lines):
+            p.say("worker %d says line %d, a line long enough to be wrapped "
+                  "at forty columns" % (i, j))
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def check_lines(text, n=8, lines=50):
+    # each said in two rows, neither interrupted
+    said = re.findall(r"worker (\d+) says line (\d+),[^\n]*\n[^\n]*columns\n", text)
+    assert len(said) * 2 == text.count('\n') == n * lines * 2
+    for i in range(n):
+        assert [int(j) for (w, j) in said if int(w) == i] == range(lines)
+
+def test_say_is_atomic():
+    out = Out()
+    p = pyline.pyline.PyLine(out=out, wrap_at=40)
+    p.say("one\ntwo {0.red:three}")
+    assert len(out.writes) == 1
+    run_workers(p)
+    check_lines(out.getvalue()[len(out.writes[0]):])
+
+def test_background_output():
+    out = Out(delay=0.002)
+    p = pyline.pyline.PyLine(out=out, wrap_at=40)
+    with p.background_output(maxsize=1000):
+        start = time.time()
+        run_workers(p)
+        # the workers didn't wait for 400 slow writes
+        assert time.time() - start < 400 * 0.002
+    check_lines(out.getvalue())
+    assert p.writer is None
+
+def test_output_is_held_during_questions():
+    inp = InputChannel()
+    out = Out()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    answers = []
+    with p.background_output():
+        p.say("before")
+        asking = threading.Thread(target=lambda: answers.append(p.ask(prompt="Name? ")))
+        asking.start()
+        while "Name? " not in out.getvalue():
+            time.sleep(0.001)
+        p.say("progress") # from another thread: doesn't wait
+        time.sleep(0.05)
+        assert "progress" not in out.getvalue()
+        inp.feed("bob\n")
+        asking.join()
+    assert answers == ["bob"]
+    assert out.getvalue() == "before\nName? progress\n"
+
+def test_saying_doesnt_wait_for_answers():
+    inp = InputChannel()
+    out = Out()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    answers = []
+    asking = threading.Thread(
+        target=lambda: answers.append(p.ask(prompt="Password: ", echo="*")))
+    asking.daemon = True
+    asking.start()
+    while "Password: " not in out.getvalue():
+        time.sleep(0.001)
+    worker = threading.Thread(target=p.say, args=("progress",))
+    worker.start()
+    worker.join(1)
+    assert not worker.is_alive() # held back, not waiting
+    assert "progress" not in out.getvalue()
+    inp.feed("secret\n")
+    asking.join()
+    assert answers == ["secret"]
+    assert out.getvalue() == "Password: ******\nprogress\n"
+
+def test_streams_are_not_interrupted():
+    out = Out()
+    p = pyline.pyline.PyLine(out=out, page_at=100)
+    started = threading.Event()
+    def chunks():
+        started.set()
+        for i in range(20):
+            time.sleep(0.002)
+            yield "row %d\n" % i
+    streaming = threading.Thread(target=p.say_stream, args=(chunks(),))
+    streaming.start()
+    started.wait()
+    for i in range(10):
+        time.sleep(0.003)
+        p.say("interruption")
+    streaming.join()
+    text = out.getvalue()
+    assert "".join("row %d\n" % i for i in range(20)) in text
+    assert text.count("interruption\n") == 10
+
+def test_held_output_is_bounded():
+    inp = InputChannel()
+    out = Out()
+    p = pyline.pyline.PyLine(inp=inp, out=out)
+    p.max_held = 3
+    asking = threading.Thread(target=lambda: p.ask(prompt="Name? "))
+    asking.daemon = True
+    asking.start()
+    while "Name? " not in out.getvalue():
+        time.sleep(0.001)
+    worker = threading.Thread(target=lambda: [p.say("line %d" % i) for i in range(5)])
+    worker.daemon = True
+    worker.start()
+    worker.join(0.2)
+    assert worker.is_alive() # waiting to say its fourth line
+    assert len(p._held) == 3
+    inp.feed("bob\n")
+    asking.join()
+    worker.join()
+    assert out.getvalue() == "Name? " + "".join("line %d\n" % i for i in range(5))